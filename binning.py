@@ -0,0 +1,67 @@
+import numpy as np
+import config
+
+# NUMBER and DATE_TIME columns are aggregated on the server, so their figures
+# carry bin counts and quartiles instead of every value. Dates are binned as
+# datetime64[s] integers and converted back for plotting.
+
+
+def _numeric(vals):
+    """Method that returns the finite values of a column as floats, and whether it holds dates."""
+    vals = np.asarray(vals)
+    if vals.dtype.kind == 'M':
+        vals = vals[~np.isnat(vals)]
+        return vals.astype('datetime64[s]').astype(np.int64).astype(np.float64), True
+    vals = vals.astype(np.float64)
+    return vals[np.isfinite(vals)], False
+
+
+def _restore(values, dates):
+    """Method that converts binned values back to their plotted type."""
+    values = np.asarray(values)
+    if not dates:
+        return values.tolist()
+    return np.datetime_as_string(np.round(values).astype(np.int64).astype('datetime64[s]')).tolist()
+
+
+def bin_edges(columns, bins=config.histogram_bins):
+    """Method that computes the bin edges shared by the columns of all
+    combinations, with at most bins bins."""
+    vals = np.concatenate([_numeric(col)[0] for col in columns]) if columns else np.array([])
+    if len(vals) == 0:
+        return None
+    edges = np.histogram_bin_edges(vals, bins='auto')
+    if len(edges) - 1 > bins:
+        edges = np.linspace(vals.min(), vals.max(), bins + 1)
+    return edges
+
+
+def histogram(col, edges):
+    """Method that returns the centers, widths and counts of the bins of a column."""
+    vals, dates = _numeric(col)
+    if edges is None:
+        edges = bin_edges([col])
+        if edges is None:
+            return [], [], []
+    counts, edges = np.histogram(vals, bins=edges)
+    widths = np.diff(edges)
+    centers = edges[:-1] + widths / 2
+    if dates:
+        widths = widths * 1000 # plotly measures date widths in ms
+    return _restore(centers, dates), widths.tolist(), counts.tolist()
+
+
+def box_stats(col):
+    """Method that returns the quartiles, fences, mean and outliers of a column."""
+    vals, dates = _numeric(col)
+    if len(vals) == 0:
+        return None
+    q1, median, q3 = np.percentile(vals, [25, 50, 75])
+    iqr = q3 - q1
+    inside = vals[(vals >= q1 - 1.5 * iqr) & (vals <= q3 + 1.5 * iqr)]
+    outliers = vals[(vals < q1 - 1.5 * iqr) | (vals > q3 + 1.5 * iqr)]
+    stats = {'q1': q1, 'median': median, 'q3': q3, 'mean': vals.mean(),
+             'lowerfence': inside.min(), 'upperfence': inside.max()}
+    stats = {key: _restore([value], dates) for key, value in stats.items()}
+    stats['outliers'] = _restore(outliers, dates)
+    return stats
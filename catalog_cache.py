@@ -0,0 +1,66 @@
+import logging
+import threading
+import time
+from simsearch_client import get_client
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogCache:
+    """Cache of the catalog of each source, with TTL and revalidation."""
+
+    def __init__(self, ttl=config.catalog_ttl, background_refresh=config.catalog_background_refresh):
+        self.ttl = ttl
+        self.background_refresh = background_refresh
+        self._entries = {}
+        self._refreshing = set()
+        self._guard = threading.Lock()
+
+    @staticmethod
+    def key(source):
+        """Method that returns the cache key of a source."""
+        return (source['simsearch_url'], source['simsearch_api'])
+
+    def fetch(self, source):
+        """Method that fetches the catalog from the SimSearch instance and caches it."""
+        response = get_client(source).post('catalog/', json={})
+        if response is None or response.status_code != 200:
+            return None
+        catalog = response.json()
+        with self._guard:
+            self._entries[self.key(source)] = (catalog, time.time())
+        return catalog
+
+    def _refresh(self, source):
+        try:
+            self.fetch(source)
+        except Exception:
+            logger.exception('Refreshing catalog of %s failed', source['simsearch_url'])
+        finally:
+            with self._guard:
+                self._refreshing.discard(self.key(source))
+
+    def get(self, source, revalidate=False):
+        """Method that returns the catalog of a source, or None if it cannot be fetched.
+        An expired catalog is still returned if the instance is unreachable."""
+        key = self.key(source)
+        with self._guard:
+            entry = self._entries.get(key)
+        if not revalidate and entry is not None and time.time() - entry[1] <= self.ttl:
+            return entry[0]
+        if not revalidate and entry is not None and self.background_refresh:
+            with self._guard:
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(source,), daemon=True).start()
+            return entry[0]
+        catalog = self.fetch(source)
+        if catalog is None and entry is not None:
+            return entry[0]
+        return catalog
+
+    def invalidate(self, source):
+        """Method that drops the cached catalog of a source."""
+        with self._guard:
+            self._entries.pop(self.key(source), None)
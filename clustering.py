@@ -1,32 +1,142 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from shapely.ops import cascaded_union
+from shapely.ops import unary_union
 from geopandas import GeoDataFrame
-from hdbscan import HDBSCAN
-from shapely.geometry import Point
+from hdbscan import HDBSCAN, approximate_predict
+from shapely.geometry import Point, MultiPoint
+try:
+    from shapely import concave_hull
+except ImportError:
+    concave_hull = None
+import config
 
+logger = logging.getLogger(__name__)
 
-def compute_clusters(pois):
-    # Compute the clusters
-    clusterer = HDBSCAN(min_cluster_size=2, min_samples=2, core_dist_n_jobs=-1)
-    labels = clusterer.fit_predict(pois)
 
+def _project(pois, metric):
+    """Method that maps lon/lat POIs to the space they are clustered in, returning
+    the coordinates and the scale that turns distances back into degrees."""
+    if metric == 'haversine':
+        return np.radians(pois[:, ::-1]), 180 / np.pi
+    elif metric == 'projected':
+        # equirectangular around the mean latitude, distances in degrees of latitude
+        scale = np.cos(np.radians(pois[:, 1].mean()))
+        return np.column_stack([pois[:, 0] * scale, pois[:, 1]]), 1
+    return pois, 1
+
+
+def _eps_per_cluster(clusterer, scale):
     tree = clusterer.condensed_tree_.to_pandas()
     cluster_tree = tree[tree.child_size > 1]
     chosen_clusters = clusterer.condensed_tree_._select_clusters()
 
     eps_per_cluster = cluster_tree[cluster_tree.child.isin(chosen_clusters)].\
         drop("parent", axis=1).drop("child", axis=1).reset_index().drop("index", axis=1)
-    eps_per_cluster['lambda_val'] = eps_per_cluster['lambda_val'].apply(lambda x: 1 / x)
+    eps_per_cluster['lambda_val'] = eps_per_cluster['lambda_val'].apply(lambda x: scale / x)
     eps_per_cluster.rename(columns={'lambda_val': 'eps', 'child_size': 'cluster_size'}, inplace=True)
+    return eps_per_cluster
+
+
+class ClusterService:
+    """HDBSCAN clustering of POIs on haversine or projected coordinates. The
+    labels are cached per (session, combination), and large sets are clustered
+    approximately: the model is fit on a sample and the rest are assigned with
+    approximate prediction. The timing of every stage is logged and kept."""
+
+    def __init__(self, metric=config.cluster_metric, sample_size=config.cluster_sample_size,
+                 size=config.cluster_cache_size):
+        self.metric = metric
+        self.sample_size = sample_size
+        self.size = size
+        self.timings = {}
+        self._entries = OrderedDict()
+        self._guard = threading.Lock()
+
+    def cluster(self, pois, key=None):
+        """Method that returns the cluster labels of the POIs and the eps of each
+        cluster (in degrees), from the cache when key was clustered before."""
+        with self._guard:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None and len(entry[0]) == len(pois):
+                self._entries.move_to_end(key)
+                return entry
+
+        timings = {}
+        start = time.perf_counter()
+        X, scale = _project(pois, self.metric)
+        timings['project'] = time.perf_counter() - start
+
+        approximate = bool(self.sample_size) and len(X) > self.sample_size
+        metric = 'haversine' if self.metric == 'haversine' else 'euclidean'
+        clusterer = HDBSCAN(min_cluster_size=2, min_samples=2, metric=metric,
+                            core_dist_n_jobs=-1, prediction_data=approximate)
+        start = time.perf_counter()
+        if approximate:
+            sample = np.random.default_rng(1).choice(len(X), self.sample_size, replace=False)
+            rest = np.setdiff1d(np.arange(len(X)), sample)
+            labels = np.empty(len(X), dtype=int)
+            labels[sample] = clusterer.fit_predict(X[sample])
+            timings['fit'] = time.perf_counter() - start
+            start = time.perf_counter()
+            labels[rest] = approximate_predict(clusterer, X[rest])[0]
+            timings['predict'] = time.perf_counter() - start
+        else:
+            labels = clusterer.fit_predict(X)
+            timings['fit'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        eps_per_cluster = _eps_per_cluster(clusterer, scale)
+        timings['tree'] = time.perf_counter() - start
+        logger.info('Clustered %d POIs (%s%s): %s', len(X), self.metric,
+                    ', approximate' if approximate else '',
+                    ', '.join('{} {:.3f}s'.format(k, v) for k, v in timings.items()))
+
+        entry = (labels, eps_per_cluster)
+        with self._guard:
+            if key is not None:
+                self.timings[key] = timings
+                self._entries[key] = entry
+                while len(self._entries) > self.size:
+                    self.timings.pop(self._entries.popitem(last=False)[0], None)
+        return entry
+
+
+clusters = ClusterService()
+
+
+def compute_clusters(pois, key=None):
+    # Compute the clusters
+    return clusters.cluster(pois, key)
 
-    return labels, eps_per_cluster
+def _shape(points, eps, mode):
+    """Method that builds the shape of a cluster from its (n, 2) points."""
+    if mode == 'concave' and concave_hull is not None:
+        return concave_hull(MultiPoint(points.tolist()), ratio=0.3).buffer(eps)
+    elif mode in ('convex', 'concave'):
+        return MultiPoint(points.tolist()).convex_hull.buffer(eps)
+    return unary_union([Point(x, y).buffer(eps) for x, y in points.tolist()])
 
-def prepare(X, Y, C, d):
-    return [(c, Point(x,y).buffer(d[c])) for (x, y, c) in zip(X,Y,C)  if c>= 0]
 
-def cluster_shapes(pois, eps_per_cluster=None):
-    f = prepare(pois.geometry.x, pois.geometry.y, pois.cluster_id, eps_per_cluster['eps'])
-    f = [(k, cascaded_union([y for (x,y) in f if x == k])) for k in dict(f).keys()]
+def cluster_shapes(pois, eps_per_cluster=None, mode=config.cluster_shape,
+                   tolerance=config.cluster_simplify):
+    """Method that builds the area of each cluster, as the union of the buffers of
+    its points or as the buffered convex/concave hull, simplified by the given
+    fraction of the eps of the cluster."""
+    X = np.column_stack([pois.geometry.x.to_numpy(), pois.geometry.y.to_numpy()])
+    C = pois.cluster_id.to_numpy()
+    order = np.argsort(C, kind='stable')
+    ids, starts = np.unique(C[order], return_index=True)
+    eps = eps_per_cluster['eps']
+    f = []
+    for k, group in zip(ids.tolist(), np.split(order, starts[1:])):
+        shape = _shape(X[group], eps[k], mode)
+        if tolerance:
+            shape = shape.simplify(tolerance * eps[k], preserve_topology=True)
+        f.append((k, shape))
     t1 = pd.DataFrame(f, columns=['cluster_id', 'geometry'])
     t1['size'] = eps_per_cluster['cluster_size'].loc[t1.cluster_id].values
     return GeoDataFrame(t1[['cluster_id', 'size','geometry']], crs='EPSG:4326')
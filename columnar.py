@@ -0,0 +1,159 @@
+import json
+import os
+import shutil
+import numpy as np
+
+# Every list of dicts inside a combination (e.g. similarityMatrix) and every dict
+# of columns (the rankedResults, see data_methods.ColumnBuilder) is stored as a
+# table, with one file per column: numeric columns as .npy typed arrays (read
+# memory-mapped), all other columns as json lists.
+
+
+def _is_table(value):
+    return isinstance(value, list) and len(value) > 0 and all(isinstance(v, dict) for v in value)
+
+
+def _is_columns(value):
+    return isinstance(value, dict) and any(isinstance(v, np.ndarray) for v in value.values())
+
+
+def _column_kind(values):
+    """Method that decides the storage type of a column."""
+    kind = None
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool) or not isinstance(v, (int, float)):
+            return 'object'
+        if isinstance(v, float):
+            kind = 'float'
+        elif kind is None:
+            kind = 'int'
+    return kind or 'object'
+
+
+def _write_table(directory, rows):
+    """Method that writes a list of dicts column by column and returns its schema."""
+    names = list(dict.fromkeys(key for row in rows for key in row))
+    columns = []
+    for no, name in enumerate(names):
+        values = [row.get(name) for row in rows]
+        kind = _column_kind(values)
+        nullable = any(v is None for v in values)
+        path = os.path.join(directory, str(no))
+        if kind == 'object':
+            with open(path + '.json', 'w') as f:
+                json.dump(values, f)
+        else:
+            if nullable:
+                arr = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                arr = np.array(values, dtype=np.int64 if kind == 'int' else np.float64)
+            np.save(path + '.npy', arr)
+        columns.append({'name': name, 'kind': kind, 'nullable': nullable})
+    return {'layout': 'rows', 'rows': len(rows), 'columns': columns}
+
+
+def _write_columns(directory, cols):
+    """Method that writes a dict of columns as is and returns its schema."""
+    columns = []
+    for no, (name, col) in enumerate(cols.items()):
+        path = os.path.join(directory, str(no))
+        if isinstance(col, np.ndarray):
+            np.save(path + '.npy', col)
+            columns.append({'name': name, 'kind': 'array'})
+        else:
+            with open(path + '.json', 'w') as f:
+                json.dump(col, f)
+            columns.append({'name': name, 'kind': 'object'})
+    rows = len(next(iter(cols.values()))) if cols else 0
+    return {'layout': 'columns', 'rows': rows, 'columns': columns}
+
+
+def write_results(path, results):
+    """Method that writes the results of a session in the columnar format."""
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    meta = {'version': 1, 'combinations': []}
+    for i, comb in enumerate(results):
+        entry = {'order': list(comb.keys()), 'fields': {}, 'tables': {}}
+        for key, value in comb.items():
+            if _is_table(value) or _is_columns(value):
+                directory = os.path.join(tmp, str(i), key)
+                os.makedirs(directory)
+                write = _write_columns if _is_columns(value) else _write_table
+                entry['tables'][key] = write(directory, value)
+            else:
+                entry['fields'][key] = value
+        meta['combinations'].append(entry)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp, path)
+
+
+def read_meta(path):
+    """Method that reads the schema of the stored results, or None if missing."""
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_column(path, no, table, name, meta=None):
+    """Method that reads a single column of a stored table, memory-mapped if numeric."""
+    meta = meta if meta is not None else read_meta(path)
+    columns = meta['combinations'][no]['tables'][table]['columns']
+    index = [c['name'] for c in columns].index(name)
+    return _read_column(os.path.join(path, str(no), table), index, columns[index])
+
+
+def _read_column(directory, index, column):
+    path = os.path.join(directory, str(index))
+    if column['kind'] == 'object':
+        with open(path + '.json') as f:
+            return json.load(f)
+    return np.load(path + '.npy', mmap_mode='r')
+
+
+def _to_list(arr, column):
+    """Method that converts a numeric column back to python values."""
+    if isinstance(arr, list):
+        return arr
+    values = arr.tolist()
+    if column['nullable']:
+        cast = int if column['kind'] == 'int' else float
+        values = [None if v != v else cast(v) for v in values]
+    return values
+
+
+def read_combination(path, no, meta=None):
+    """Method that reads a single combination, rebuilding the rows of its tables
+    (the column tables are returned as dicts of memory-mapped columns)."""
+    meta = meta if meta is not None else read_meta(path)
+    if meta is None:
+        return None
+    entry = meta['combinations'][no]
+    comb = dict(entry['fields'])
+    for table, schema in entry['tables'].items():
+        directory = os.path.join(path, str(no), table)
+        names = [c['name'] for c in schema['columns']]
+        if schema['layout'] == 'columns':
+            comb[table] = {name: _read_column(directory, i, c)
+                           for i, (name, c) in enumerate(zip(names, schema['columns']))}
+            continue
+        cols = [_to_list(_read_column(directory, i, c), c) for i, c in enumerate(schema['columns'])]
+        comb[table] = [dict(zip(names, values)) for values in zip(*cols)]
+    return {key: comb[key] for key in entry['order']}
+
+
+def read_results(path):
+    """Method that reads all combinations of the stored results, or None if missing."""
+    meta = read_meta(path)
+    if meta is None:
+        return None
+    return [read_combination(path, no, meta) for no in range(len(meta['combinations']))]
@@ -0,0 +1,93 @@
+import os
+
+# Directory where the artifacts of each session are persisted
+output_dir = os.environ.get('SIMSEARCH_UI_OUTPUT', 'output')
+
+# Session store: 'memory', 'disk' or 'shared' (the latter two are fronted by the memory LRU)
+session_backend = os.environ.get('SIMSEARCH_UI_SESSION_BACKEND', 'disk')
+session_memory_budget = int(os.environ.get('SIMSEARCH_UI_SESSION_MEMORY', 256 * 2**20))
+session_ttl = int(os.environ.get('SIMSEARCH_UI_SESSION_TTL', 3600))
+shared_cache_url = os.environ.get('SIMSEARCH_UI_SHARED_CACHE', 'local://')
+
+# Janitor of the output directory: sessions older than the max age (since their
+# last access) are removed, then the least recently accessed until under the quota
+janitor_interval = int(os.environ.get('SIMSEARCH_UI_JANITOR_INTERVAL', 300))
+session_max_age = int(os.environ.get('SIMSEARCH_UI_SESSION_MAX_AGE', 24 * 3600))
+output_quota = int(os.environ.get('SIMSEARCH_UI_OUTPUT_QUOTA', 2**30))
+
+# Cache of flattened SimSearch results, shared by all sessions
+query_cache_ttl = int(os.environ.get('SIMSEARCH_UI_QUERY_CACHE_TTL', 600))
+query_cache_budget = int(os.environ.get('SIMSEARCH_UI_QUERY_CACHE_MEMORY', 64 * 2**20))
+
+# HTTP client of the SimSearch instances
+simsearch_timeout = (float(os.environ.get('SIMSEARCH_UI_CONNECT_TIMEOUT', 3.05)),
+                     float(os.environ.get('SIMSEARCH_UI_READ_TIMEOUT', 120)))
+simsearch_retries = int(os.environ.get('SIMSEARCH_UI_RETRIES', 2))
+simsearch_pool_size = int(os.environ.get('SIMSEARCH_UI_POOL_SIZE', 10))
+breaker_threshold = int(os.environ.get('SIMSEARCH_UI_BREAKER_THRESHOLD', 5))
+breaker_cooldown = int(os.environ.get('SIMSEARCH_UI_BREAKER_COOLDOWN', 30))
+
+# Background execution of search submissions
+job_workers = int(os.environ.get('SIMSEARCH_UI_JOB_WORKERS', 4))
+job_max_pending = int(os.environ.get('SIMSEARCH_UI_JOB_MAX_PENDING', 32))
+job_ttl = int(os.environ.get('SIMSEARCH_UI_JOB_TTL', 600))
+job_poll_interval = int(os.environ.get('SIMSEARCH_UI_JOB_POLL_INTERVAL', 500))
+
+# Cache of the catalog (columns & datatypes) of each source; stale entries are
+# refreshed in the background and kept if the instance is unreachable
+catalog_ttl = int(os.environ.get('SIMSEARCH_UI_CATALOG_TTL', 3600))
+catalog_background_refresh = os.environ.get('SIMSEARCH_UI_CATALOG_REFRESH', '1') == '1'
+
+# Shared ElasticSearch clients, used for suggestions & entity lookup
+es_timeout = float(os.environ.get('SIMSEARCH_UI_ES_TIMEOUT', 2))
+es_pool_size = int(os.environ.get('SIMSEARCH_UI_ES_POOL_SIZE', 10))
+es_health_interval = int(os.environ.get('SIMSEARCH_UI_ES_HEALTH_INTERVAL', 30))
+
+# Local suggestion index of the sources that enable it ("suggest_index" in the settings)
+suggest_refresh_interval = int(os.environ.get('SIMSEARCH_UI_SUGGEST_REFRESH', 3600))
+
+# Shared cache of recent suggestion prefixes, expired so that new entities show up
+suggest_cache_ttl = int(os.environ.get('SIMSEARCH_UI_SUGGEST_CACHE_TTL', 60))
+
+# Short-lived cache of the entities returned as suggestions
+entity_cache_ttl = int(os.environ.get('SIMSEARCH_UI_ENTITY_CACHE_TTL', 300))
+entity_cache_size = int(os.environ.get('SIMSEARCH_UI_ENTITY_CACHE_SIZE', 10000))
+entity_prefetch_workers = int(os.environ.get('SIMSEARCH_UI_ENTITY_PREFETCH_WORKERS', 2))
+
+# Rows per page of the Listing, served from the session store
+table_page_size = int(os.environ.get('SIMSEARCH_UI_TABLE_PAGE_SIZE', 50))
+
+# Rendered word clouds, reused across views and combinations
+wordcloud_cache_size = int(os.environ.get('SIMSEARCH_UI_WORDCLOUD_CACHE_SIZE', 256))
+wordcloud_workers = int(os.environ.get('SIMSEARCH_UI_WORDCLOUD_WORKERS', 4))
+
+# Background precomputation of the plots of submitted queries
+warmup_workers = int(os.environ.get('SIMSEARCH_UI_WARMUP_WORKERS', 2))
+
+# Largest side of the similarity heatmaps, larger matrices are block-averaged (0 disables)
+heatmap_max_size = int(os.environ.get('SIMSEARCH_UI_HEATMAP_MAX_SIZE', 200))
+
+# Most bins of the NUMBER & DATE_TIME histograms, shared by all combinations
+histogram_bins = int(os.environ.get('SIMSEARCH_UI_HISTOGRAM_BINS', 50))
+
+# Clustering of the POIs ("haversine", "projected" or "degrees"); sets larger
+# than the sample size are fit on a sample and the rest are predicted (0 disables it)
+cluster_metric = os.environ.get('SIMSEARCH_UI_CLUSTER_METRIC', 'haversine')
+cluster_sample_size = int(os.environ.get('SIMSEARCH_UI_CLUSTER_SAMPLE_SIZE', 5000))
+cluster_cache_size = int(os.environ.get('SIMSEARCH_UI_CLUSTER_CACHE_SIZE', 64))
+
+# Areas of the clusters ("union" of buffers, "convex" or "concave" hull), simplified
+# by this fraction of their eps (0 disables it)
+cluster_shape = os.environ.get('SIMSEARCH_UI_CLUSTER_SHAPE', 'union')
+cluster_simplify = float(os.environ.get('SIMSEARCH_UI_CLUSTER_SIMPLIFY', 0.1))
+
+# HeatMap of the POIs: "heat" of grid cells weighted by their scores, "grid" choropleth
+# of the mean score of the cells, or "points" for every POI; cells are "square" or "hex"
+heatmap_mode = os.environ.get('SIMSEARCH_UI_HEATMAP_MODE', 'heat')
+heatmap_grid = os.environ.get('SIMSEARCH_UI_HEATMAP_GRID', 'hex')
+heatmap_cells = int(os.environ.get('SIMSEARCH_UI_HEATMAP_CELLS', 64))
+
+# Rendered maps & images, served from content-addressed routes under the url
+content_dir = os.environ.get('SIMSEARCH_UI_CONTENT_DIR', os.path.join(output_dir, 'content'))
+content_quota = int(os.environ.get('SIMSEARCH_UI_CONTENT_QUOTA', 256 * 2**20))
+content_url = '/content/'
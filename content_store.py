@@ -0,0 +1,89 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+import config
+
+logger = logging.getLogger(__name__)
+
+# Rendered maps and images are served from content-addressed routes, so the
+# callbacks only return their URL and browsers reuse what they have seen.
+MIMETYPES = {'html': 'text/html; charset=utf-8', 'png': 'image/png'}
+
+
+class ContentStore:
+    """Content-addressed store of rendered artifacts on disk, named by the
+    sha256 of their bytes and kept under a byte quota, least recently used first."""
+
+    def __init__(self, directory=config.content_dir, quota=config.content_quota, url=config.content_url):
+        self.directory = directory
+        self.quota = quota
+        self.url = url
+        self._guard = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+
+    def path(self, digest, ext):
+        """Method that returns the path of an artifact."""
+        return os.path.join(self.directory, '{}.{}'.format(digest, ext))
+
+    def put(self, body, ext):
+        """Method that stores an artifact, returning its URL."""
+        if isinstance(body, str):
+            body = body.encode()
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.path(digest, ext)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            tmp = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, path)
+            with self._guard:
+                self.size += len(body)
+            if self.size > self.quota:
+                self._prune()
+        return '{}{}.{}'.format(self.url, digest, ext)
+
+    def get(self, digest, ext):
+        """Method that returns the bytes of an artifact, or None if missing."""
+        path = self.path(digest, ext)
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return body
+
+    def exists(self, url):
+        """Method that returns whether the artifact of a URL is still stored."""
+        if not url.startswith(self.url) or '.' not in url:
+            return False
+        digest, ext = url[len(self.url):].split('.', 1)
+        return os.path.exists(self.path(digest, ext))
+
+    def _prune(self):
+        with self._guard:
+            entries = []
+            for f in os.listdir(self.directory):
+                path = os.path.join(self.directory, f)
+                try:
+                    entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except FileNotFoundError:
+                    continue
+            self.size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if self.size <= self.quota:
+                    break
+                try:
+                    os.remove(path)
+                    self.size -= size
+                except FileNotFoundError:
+                    continue
+            logger.info('Pruned content store to %d bytes', self.size)
+
+
+contents = ContentStore()
@@ -1,8 +1,13 @@
 import dash
 from dash_table.Format import Format, Scheme
-from elasticsearch import Elasticsearch
+from es_clients import get_es_client
+from suggest_index import get_suggest_index
+from entity_cache import entities
 from itertools import islice
 from dateutil.parser import parse
+from datetime import timezone
+import numpy as np
+import pandas as pd
 
 def fetch_input(inputs, sliders, i, attr):
     """Method for returning input value with corresponding weights for the submission query."""
@@ -69,36 +74,189 @@ def transform_field(x, attr_type):
         else:
             return x
 
-def flatten(results, attr):
-    """Method that flattens the response json into the appropriate format for internal manipulation."""
-    final = []
-    seen = set()
-    for r in results:
-        d = {}
-        
-        if r['id'] in seen:
-            continue
-        seen.add(r['id'])
-        
-        d['id'] = transform_field(r['id'], "id")
-        #d['name'] = name
-        # d['name'] = r['name']
-        d['name'] = r['extraAttributes']['name']
+class ColumnBuilder:
+    """Builder of the columnar format of ranked results: one array per column,
+    appended row by row (deduplicated by id) and parsed in one vectorized pass."""
+
+    def __init__(self, attr):
+        self.attr = attr
+        self.seen = set()
+        self.cols = {'id': [], 'name': [], 'score': [], 'rank': [], 'exact': []}
+        self.attrs = []
+
+    def append(self, r):
+        """Method that appends a ranked result of the response json, returning False if duplicate."""
+        if r['id'] in self.seen:
+            return False
+        self.seen.add(r['id'])
+        n = len(self.cols['id'])
+        self.cols['id'].append(r['id'])
+        self.cols['name'].append(r['extraAttributes']['name'])
         for key in ['score', 'rank', 'exact']:
-            d[key] = r[key]
+            self.cols[key].append(r[key])
         for a in r['attributes']:
             name = a['name']
-            d['{}_value'.format(name)] = transform_field(a['value'], attr[name])
-            d['{}_score'.format(name)] = a['score']
-        final.append(d)
-    return final
+            if name not in self.attrs:
+                self.attrs.append(name)
+                self.cols[f'{name}_value'] = [None] * n
+                self.cols[f'{name}_score'] = [None] * n
+            self.cols[f'{name}_value'].append(a['value'])
+            self.cols[f'{name}_score'].append(a['score'])
+        for name in self.attrs:
+            if len(self.cols[f'{name}_value']) == n:
+                self.cols[f'{name}_value'].append(None)
+                self.cols[f'{name}_score'].append(None)
+        return True
+
+    def finish(self):
+        """Method that returns the parsed columns."""
+        cols = {}
+        cols['id'] = [transform_field(x, "id") for x in self.cols['id']]
+        cols['name'] = self.cols['name']
+        cols['score'] = np.array(self.cols['score'], dtype=np.float64)
+        cols['rank'] = np.array(self.cols['rank'], dtype=np.int64)
+        cols['exact'] = np.array(self.cols['exact'], dtype=bool)
+        for name in self.attrs:
+            cols[f'{name}_value'] = parse_column(self.cols[f'{name}_value'], self.attr[name])
+            cols[f'{name}_score'] = pd.to_numeric(pd.Series(self.cols[f'{name}_score'], dtype=object),
+                                                  errors='coerce').to_numpy(np.float64)
+        return cols
+
+
+def _parse_date(x):
+    """Method that parses a DATE_TIME value to a naive UTC datetime (None if missing or malformed).
+    Values are parsed one by one, as their formats (e.g. fractional seconds) may differ."""
+    if x is None or x == 'NaN' or x == '':
+        return None
+    try:
+        d = parse(x)
+    except (ValueError, OverflowError):
+        return None
+    if d.tzinfo is not None:
+        d = d.astimezone(timezone.utc).replace(tzinfo=None)
+    return d
+
+
+def parse_column(values, attr_type):
+    """Method that parses a value column to its typed array: NUMBER to floats (NaN if missing),
+    DATE_TIME to datetime64 (NaT if missing), GEOLOCATION to an (n, 2) array of lon/lat."""
+    s = pd.Series(values, dtype=object)
+    if attr_type == 'NUMBER':
+        s = pd.to_numeric(s.where(s != '', '0'), errors='coerce')
+        return np.trunc(s.to_numpy(np.float64))
+    if attr_type == 'DATE_TIME':
+        return pd.to_datetime([_parse_date(x) for x in values], errors='coerce').to_numpy()
+    if attr_type == 'GEOLOCATION':
+        return s.str.extract(r'POINT\s*\(\s*(\S+)\s+(\S+)\s*\)').astype(float).to_numpy()
+    return [None if x is None or x == 'NaN' else x for x in values]
+
+
+def _column_values(key, col):
+    """Method that converts a column to the native values shown in the DataTable."""
+    if isinstance(col, list):
+        return col
+    elif col.dtype.kind == 'M':
+        return [None if s == 'NaT' else s for s in np.datetime_as_string(col, unit='s').tolist()]
+    elif col.ndim == 2:
+        return [None if x != x else 'POINT ({} {})'.format(x, y) for x, y in col.tolist()]
+    elif key.endswith('_value'):
+        return [None if x != x else int(x) for x in col.tolist()]
+    elif col.dtype.kind == 'f':
+        return [None if x != x else x for x in col.tolist()]
+    return col.tolist()
+
+
+def _take(col, index):
+    """Method that selects the given positions of a column."""
+    if index is None:
+        return col
+    if isinstance(col, list):
+        return [col[i] for i in index]
+    return col[index]
+
+
+def to_rows(cols, index=None):
+    """Method that builds the rows of the DataTable from the columnar format,
+    optionally only for the given positions."""
+    values = [_column_values(key, _take(col, index)) for key, col in cols.items()]
+    keys = list(cols.keys())
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+
+FILTER_OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'],
+                    ['ne ', '!='], ['eq ', '='], ['contains '], ['datestartswith ']]
+
+
+def split_filter_part(filter_part):
+    """Method that splits a DataTable filter expression into column, operator and value."""
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value_part = value_part.strip()
+                v0 = value_part[:1]
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`') and len(value_part) > 1:
+                    value = value_part[1:-1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def _table_series(key, col):
+    """Method that returns a column as a Series that can be compared and sorted:
+    numeric columns as they are, all other columns as their displayed text."""
+    if not isinstance(col, list) and col.ndim == 1 and col.dtype.kind in 'biuf':
+        return pd.Series(col)
+    return pd.Series([None if v is None else str(v) for v in _column_values(key, col)], dtype=object)
+
+
+def query_table(cols, page, page_size, sort_by, filter_query):
+    """Method that filters and sorts the columnar results as the DataTable
+    asks, returning the rows of the requested page and the number of pages.
+    Only the columns referred to by the query are converted."""
+    n = len(cols['id'])
+    mask = np.ones(n, dtype=bool)
+    for part in (filter_query or '').split(' && '):
+        name, op, value = split_filter_part(part)
+        if name not in cols:
+            continue
+        s = _table_series(name, cols[name])
+        if s.dtype == object or op in ('contains', 'datestartswith'):
+            s = s.astype(str).where(s.notna())
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            value = str(value)
+        if op == 'contains':
+            m = s.str.contains(value, regex=False)
+        elif op == 'datestartswith':
+            m = s.str.startswith(value)
+        else:
+            m = getattr(s, op)(value)
+        mask &= m.fillna(False).to_numpy(dtype=bool)
+    index = np.flatnonzero(mask)
+
+    sort_by = [s for s in (sort_by or []) if s['column_id'] in cols]
+    if sort_by and len(index):
+        frame = pd.DataFrame({i: _table_series(s['column_id'], cols[s['column_id']]).iloc[index].to_numpy()
+                              for i, s in enumerate(sort_by)})
+        order = frame.sort_values(by=list(frame.columns), kind='mergesort', na_position='last',
+                                  ascending=[s['direction'] == 'asc' for s in sort_by]).index
+        index = index[order.to_numpy()]
+
+    page_count = max(1, -(-len(index) // page_size))
+    return to_rows(cols, index[page * page_size:(page + 1) * page_size]), page_count
 
 
 def mod_cols(results):
     """Method that modifies the format of the columns of the datatable."""
     
     order = ['rank', 'name', 'score', 'id']
-    for i in results[0].keys():
+    for i in results.keys():
         if i.endswith('_value'):
             order.append(i)
     
@@ -106,75 +264,109 @@ def mod_cols(results):
     for i in order:
         if i != 'id':
             name = i[:-6] if i.endswith('_value') else i
-            if isinstance(results[0][i], str):
-                cols.append({"name": name, "id": i, "type":'text'})
-            elif isinstance(results[0][i], float):
+            col = results[i]
+            if isinstance(col, list):
+                first = next((x for x in col if x is not None), None)
+                if isinstance(first, list):
+                    cols.append({"name": name, "id": i})
+                else:
+                    cols.append({"name": name, "id": i, "type":'text'})
+            elif col.ndim == 1 and col.dtype.kind == 'f' and not i.endswith('_value'):
                 cols.append({"name": name, "id": i, "type":'numeric', "format": Format(precision=2, scheme=Scheme.fixed)})
-            elif isinstance(results[0][i], int):    
+            elif col.ndim == 1 and col.dtype.kind in 'iuf':
                 cols.append({"name": name, "id": i, "type":'numeric', "format": Format()})
-            elif isinstance(results[0][i], list):
-                cols.append({"name": name, "id": i})
+            else:
+                cols.append({"name": name, "id": i, "type":'text'})
         else:
             cols.append({"name": i, "id": i, 'presentation':'markdown'})
     return cols
 
-def fetch_ids(name, source):
-    """Method that fetches suggestions from an ElasticSearch Index."""
-    if name is None or name == '' or 'es_url' not in source:
+def fetch_ids(name, source, attr=None):
+    """Method that fetches suggestions from the local index, or else from an ElasticSearch Index.
+    If the attributes are given, the documents of the suggestions are also cached."""
+    if name is None or name == '':
+        return None
+    
+    index = get_suggest_index(source)
+    if index is not None:
+        return index.search(name, 10)
+    if 'es_url' not in source:
         return None
 
-    client = Elasticsearch(hosts=source['es_url'])
+    client = get_es_client(source['es_url'])
     field = source['es_field']
     
     names = name.lower().split(' ')
+    fields = [field, 'id'] + (list(attr.keys()) if attr else [])
     query = {"track_scores":"true",
-             "_source": [field, 'id'],
+             "_source": fields,
              "query" : {"bool" : {
                      "must" : {"prefix": {field: names[0]}},
                      "filter" : [{"bool" : {"should" : [{"prefix" : {field : w}} for w in names[1:]]}}]
                      }}}
     
     response = client.search(index=source['es_index'], body=query)
+    if response is None:
+        return None
     
-    d = ((hit['_source']['id'], hit['_source'][field]) for hit in response['hits']['hits'])
-    d = list(islice(d, 10))
+    hits = list(islice(response['hits']['hits'], 10))
+    if attr:
+        entities.put(source, [hit['_source'] for hit in hits])
+    d = [(hit['_source']['id'], hit['_source'][field]) for hit in hits]
     return d
 
 
+def prefetch_entities(pairs, attr, source):
+    """Method that caches the documents of suggested entities with a single batched request."""
+    missing = entities.missing(source, pairs)
+    if len(missing) == 0 or 'es_url' not in source:
+        return
+    
+    fields = [source['es_field'], 'id'] + list(attr.keys())
+    query = {"_source": fields, "size": len(missing),
+             "query": {"terms": {"id": [id for id, label in missing]}}}
+    response = get_es_client(source['es_url']).search(index=source['es_index'], body=query)
+    if response is not None:
+        entities.put(source, [hit['_source'] for hit in response['hits']['hits']])
+
+
 def fetch_id(name, id, attr, source):
-    """Method that fetches a specific entity from an ElasticSearch Index,
-    with all the appropriate fields."""
+    """Method that fetches a specific entity from the cache of suggestions or
+    an ElasticSearch Index, with all the appropriate fields."""
     if name is None or name == '' or 'es_url' not in source:
         return None
 
-    client = Elasticsearch(hosts=source['es_url'])
+    doc = entities.get(source, name, id)
+    if doc is None:
+        client = get_es_client(source['es_url'])
 
-    field = source['es_field']
-    fields = [field] + list(attr.keys())
+        field = source['es_field']
+        fields = [field] + list(attr.keys())
 
-    query = {"track_scores":"true",
-             "_source": fields,
-             "query": {"bool" : {"must" : {"match" : { field : name}},
-                                 "should": {"prefix" : { "id" : id }}}}}
+        query = {"track_scores":"true",
+                 "_source": fields,
+                 "query": {"bool" : {"must" : {"match" : { field : name}},
+                                     "should": {"prefix" : { "id" : id }}}}}
 
-    response = client.search(index=source['es_index'], body=query)
-    for hit in response['hits']['hits']:
-        break
+        response = client.search(index=source['es_index'], body=query)
+        if response is None or len(response['hits']['hits']) == 0:
+            return None
+        doc = response['hits']['hits'][0]['_source']
     
     d1, d2 = [], []
     for key in attr:
-        if key in hit['_source']:
+        if key in doc:
             if attr[key] == 'GEOLOCATION':
-                d1.append(float(hit['_source'][key].split(',')[1]))
-                d1.append(float(hit['_source'][key].split(',')[0]))
+                d1.append(float(doc[key].split(',')[1]))
+                d1.append(float(doc[key].split(',')[0]))
             elif attr[key] == 'DATE_TIME':
-                d2.append(parse(hit['_source'][key]).date())
+                d2.append(parse(doc[key]).date())
             elif attr[key] == 'NUMBER':         
-                val = hit['_source'][key]
-                val = int(float(hit['_source'][key])) if val is not None else None
+                val = doc[key]
+                val = int(float(doc[key])) if val is not None else None
                 d1.append(val)
             else:
-                d1.append(','.join(set(hit['_source'][key].split(','))))
+                d1.append(','.join(set(doc[key].split(','))))
         else:
             if attr[key] == 'GEOLOCATION':
                 d1.append(dash.no_update)
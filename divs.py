@@ -3,19 +3,7 @@ import dash_html_components as html
 from styles import style_div, style_drop_list, active_color, active_light_color, active_dark_color
 import dash_table
 import os
-
-
-def make_store_plots(attr, w):
-    """Init value for caching plots"""
-    fields = {'NUMBER': ['Histogram', 'Boxplot'],
-              'DATE_TIME': ['Histogram', 'Boxplot'],
-              'GEOLOCATION': ['Clustered POIS', 'HeatMap', 'Clustered Wordclouds'], 
-              'KEYWORD_SET': ['WordCloud', 'Top-10 Histogram']}
-    
-    stats = [[None]*w, [None]*3]
-    plots = [ [[None]*w]*len(fields[v]) for k, v in attr.items()]
-    
-    return [stats, plots]
+import config
 
 
 def make_full_sliders(attr=[]):
@@ -159,7 +147,10 @@ def make_tabs():
 def __make_listings_tab():
     """Create tab 1 for listings"""    
     table = dash_table.DataTable(id='table', data=[], style_table={'width':'90%', 'margin-left':'5%'},
-                                 sort_action="native", page_action="none", row_selectable="single", 
+                                 sort_action="custom", sort_mode="multi", sort_by=[],
+                                 filter_action="custom", filter_query='',
+                                 page_action="custom", page_current=0, page_size=config.table_page_size,
+                                 row_selectable="single", 
                                  #style_cell={'whiteSpace': 'normal','height': 'auto',},
                                  style_cell={'maxWidth': 0},
                                  style_data_conditional=[{'if': {'row_index': 'odd'},'backgroundColor': 'rgb(230, 230, 230)'}],
@@ -203,6 +194,11 @@ def __make_statistics_tab():
                                          dcc.Loading(html.Div(children=[
                                              html.Div(style={'width':'33%'}, children=dcc.Graph(id={'index': f'fig_2_2_{i}', 'type':'interplot'}, style={'width':'100%'})) for i in range(1,4)], 
                                              style={'display':'flex'})
+                                         ),
+                                         html.H2('Top-k Agreement', style=style_div),
+                                         dcc.Loading(html.Div(children=[
+                                             html.Div(style={'width':'50%'}, children=dcc.Graph(id={'index': f'fig_2_2_{i}', 'type':'interplot'}, style={'width':'100%'})) for i in range(4,6)], 
+                                             style={'display':'flex'})
                                          )])
                       
                       
@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+import config
+
+
+class EntityCache:
+    """Short-lived cache of the documents of suggested entities, keyed by their label,
+    so that picking a suggestion fills the inputs without another request."""
+
+    def __init__(self, ttl=config.entity_cache_ttl, size=config.entity_cache_size):
+        self.ttl = ttl
+        self.size = size
+        self._entries = OrderedDict()
+        self._guard = threading.Lock()
+
+    def put(self, source, docs):
+        """Method that caches the documents of a source."""
+        field = source['es_field']
+        now = time.time()
+        with self._guard:
+            for doc in docs:
+                key = (source['name'], doc.get(field))
+                found = self._entries.get(key, (now, {}))[1]
+                found[doc.get('id')] = doc
+                self._entries[key] = (now, found)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, source, label, id=None):
+        """Method that returns the cached document with the label (and id prefix), or None."""
+        with self._guard:
+            entry = self._entries.get((source['name'], label))
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        for doc_id, doc in entry[1].items():
+            if not id or str(doc_id).startswith(id):
+                return doc
+        return None
+
+    def missing(self, source, pairs):
+        """Method that returns the (id, label) pairs whose documents are not cached."""
+        return [(id, label) for id, label in pairs if self.get(source, label, str(id)) is None]
+
+
+entities = EntityCache()
@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import ConnectionError, ConnectionTimeout
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class ESClient:
+    """Shared client of an ElasticSearch instance, with connection pooling,
+    request timeouts and a periodic health check."""
+
+    def __init__(self, es_url, timeout=config.es_timeout, pool_size=config.es_pool_size,
+                 health_interval=config.es_health_interval):
+        self.es_url = es_url
+        self.health_interval = health_interval
+        self.client = Elasticsearch(hosts=es_url, timeout=timeout, maxsize=pool_size,
+                                    retry_on_timeout=False, max_retries=1)
+        self._healthy = True
+        self._checked = 0
+        self._guard = threading.Lock()
+
+    def healthy(self):
+        """Method that returns whether the instance is up as of the last ping. It is
+        pinged in the background at most once per interval, so callers never wait."""
+        with self._guard:
+            if time.time() - self._checked >= self.health_interval:
+                self._checked = time.time()
+                threading.Thread(target=self._ping, name='es-health', daemon=True).start()
+            return self._healthy
+
+    def _ping(self):
+        healthy = self.client.ping(request_timeout=1)
+        if not healthy:
+            logger.warning('ElasticSearch instance %s is unreachable', self.es_url)
+        with self._guard:
+            self._healthy, self._checked = healthy, time.time()
+
+    def search(self, **kwargs):
+        """Method that runs a search, returning None if the instance is down."""
+        if not self.healthy():
+            return None
+        try:
+            return self.client.search(**kwargs)
+        except (ConnectionError, ConnectionTimeout) as e:
+            logger.warning('ElasticSearch request to %s failed: %s', self.es_url, e)
+            with self._guard:
+                self._healthy, self._checked = False, time.time()
+            return None
+
+
+_clients = {}
+_clients_guard = threading.Lock()
+
+
+def get_es_client(es_url):
+    """Method that returns the shared client of an ElasticSearch url."""
+    with _clients_guard:
+        if es_url not in _clients:
+            _clients[es_url] = ESClient(es_url)
+        return _clients[es_url]
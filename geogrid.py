@@ -0,0 +1,79 @@
+import numpy as np
+import folium
+from branca.colormap import linear
+import config
+
+# POIs are aggregated into square or hexagonal cells on the server, so the map
+# carries one entry per cell instead of one per POI. Cells are laid out on an
+# equirectangular projection around the mean latitude, with their size picked
+# so that the longest side of the bounding box spans the given number of cells.
+
+
+def _hex_round(q, r):
+    """Method that rounds fractional axial hex coordinates to the nearest hex."""
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def grid_cells(x, y, scores, cells=config.heatmap_cells, shape=config.heatmap_grid):
+    """Method that bins lon/lat POIs into cells, returning the centers, count
+    and mean score of every non-empty cell."""
+    scale = np.cos(np.radians(y.mean()))
+    px, py = (x - x.min()) * scale, y - y.min()
+    size = max(px.max(), py.max()) / cells or 1.0
+    if shape == 'hex':
+        size /= np.sqrt(3)
+        i, j = _hex_round((np.sqrt(3) / 3 * px - py / 3) / size, 2 / 3 * py / size)
+    else:
+        i, j = np.floor(px / size).astype(np.int64), np.floor(py / size).astype(np.int64)
+    keys, inverse = np.unique(np.column_stack([i, j]), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    count = np.bincount(inverse)
+    score = np.bincount(inverse, weights=scores) / count
+    i, j = keys[:, 0], keys[:, 1]
+    if shape == 'hex':
+        cx, cy = size * np.sqrt(3) * (i + j / 2), size * 1.5 * j
+    else:
+        cx, cy = size * (i + 0.5), size * (j + 0.5)
+    return {'x': cx / scale + x.min(), 'y': cy + y.min(), 'count': count, 'score': score,
+            'size': size, 'scale': scale, 'shape': shape}
+
+
+def _polygon(cells, c):
+    """Method that returns the lon/lat ring of a cell."""
+    size, scale = cells['size'], cells['scale']
+    if cells['shape'] == 'hex':
+        angles = np.radians(30 + 60 * np.arange(7))
+        dx, dy = size * np.cos(angles), size * np.sin(angles)
+    else:
+        dx, dy = size / 2 * np.array([-1, 1, 1, -1, -1]), size / 2 * np.array([-1, -1, 1, 1, -1])
+    return np.column_stack([cells['x'][c] + dx / scale, cells['y'][c] + dy]).round(6).tolist()
+
+
+def grid_layer(cells):
+    """Method that renders the cells as a choropleth of their mean score."""
+    colormap = linear.YlOrRd_09.scale(cells['score'].min(), cells['score'].max())
+    features = [{'type': 'Feature',
+                 'geometry': {'type': 'Polygon', 'coordinates': [_polygon(cells, c)]},
+                 'properties': {'count': int(cells['count'][c]), 'score': round(float(cells['score'][c]), 3),
+                                'color': colormap(cells['score'][c])}}
+                for c in range(len(cells['count']))]
+    layer = folium.GeoJson({'type': 'FeatureCollection', 'features': features},
+                           style_function=lambda f: {'fillColor': f['properties']['color'], 'color': None,
+                                                     'weight': 0, 'fillOpacity': 0.6},
+                           tooltip=folium.GeoJsonTooltip(['count', 'score'], aliases=['POIs', 'Mean score']))
+    return layer, colormap
+
+
+def heat_points(cells):
+    """Method that returns the weighted (lat, lon, weight) points of a heat layer,
+    weighting every cell by the total score of its POIs (scaled to at most 1)."""
+    weights = cells['count'] * cells['score']
+    weights = weights / weights.max() if weights.max() > 0 else weights
+    return zip(cells['y'].tolist(), cells['x'].tolist(), weights.round(4).tolist())
@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+import time
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _size(path):
+    """Method that returns the bytes of a file or directory."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def scan(directory):
+    """Method that groups the artifacts of the output directory per session,
+    returning the bytes and last modification of each session."""
+    sessions = {}
+    for f in os.listdir(directory):
+        name = f.split('.')[0]
+        if '_' not in name:
+            continue
+        session_id = name.split('_', 1)[1]
+        path = os.path.join(directory, f)
+        try:
+            size, modified = _size(path), os.path.getmtime(path)
+        except FileNotFoundError:
+            continue
+        s = sessions.setdefault(session_id, {'bytes': 0, 'modified': 0})
+        s['bytes'] += size
+        s['modified'] = max(s['modified'], modified)
+    return sessions
+
+
+class Janitor(threading.Thread):
+    """Background thread that removes the artifacts of old sessions, enforcing
+    a max age and a byte quota on the output directory. Sessions for which busy
+    returns true (e.g. with pending plot warm-ups) are left for a later run."""
+
+    def __init__(self, store, directory=config.output_dir, max_age=config.session_max_age,
+                 quota=config.output_quota, interval=config.janitor_interval, busy=None):
+        super().__init__(name='janitor', daemon=True)
+        self.store = store
+        self.directory = directory
+        self.max_age = max_age
+        self.quota = quota
+        self.interval = interval
+        self.busy = busy
+        self.stats = {'reclaimed_bytes': 0, 'evicted_sessions': 0,
+                      'live_sessions': 0, 'live_bytes': 0}
+        self._halt = threading.Event()
+
+    def last_access(self, session_id, info):
+        """Method that returns the last access of a session, by this process or on disk."""
+        return max(self.store.last_access(session_id) or 0, info['modified'])
+
+    def evict(self, session_id):
+        """Method that removes a session, waiting for any writer holding its lock."""
+        with self.store.lock(session_id):
+            self.store.delete(session_id)
+
+    def collect(self):
+        """Method that runs a single collection and returns the reclaimed bytes."""
+        now = time.time()
+        sessions = scan(self.directory)
+        order = sorted(sessions, key=lambda s: self.last_access(s, sessions[s]))
+        total = sum(s['bytes'] for s in sessions.values())
+        reclaimed = 0
+        for session_id in order:
+            expired = now - self.last_access(session_id, sessions[session_id]) > self.max_age
+            if not expired and total <= self.quota:
+                break
+            if self.busy is not None and self.busy(session_id):
+                continue
+            self.evict(session_id)
+            total -= sessions[session_id]['bytes']
+            reclaimed += sessions[session_id]['bytes']
+            del sessions[session_id]
+
+        self.stats['reclaimed_bytes'] += reclaimed
+        self.stats['evicted_sessions'] += len(order) - len(sessions)
+        self.stats['live_sessions'] = len(sessions)
+        self.stats['live_bytes'] = total
+        logger.info('Janitor reclaimed %d bytes, %d live sessions (%d bytes)',
+                    reclaimed, len(sessions), total)
+        return reclaimed
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            try:
+                self.collect()
+            except Exception:
+                logger.exception('Janitor collection failed')
+
+    def stop(self):
+        """Method that stops the background thread."""
+        self._halt.set()
@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """Runs functions as background jobs on a bounded pool of workers, keeping
+    their status and result until they are polled or expire. Each function is
+    called with a `progress` keyword, a callable for reporting its progress."""
+
+    def __init__(self, workers=config.job_workers, max_pending=config.job_max_pending,
+                 ttl=config.job_ttl, name='job'):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._guard = threading.Lock()
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [j for j, job in self._jobs.items()
+                       if job['finished'] is not None and now - job['finished'] > self.ttl]:
+            del self._jobs[job_id]
+
+    def submit(self, fn, *args):
+        """Method that schedules a job, returning its id or None if too many are pending."""
+        with self._guard:
+            self._expire()
+            if sum(job['status'] in ('pending', 'running') for job in self._jobs.values()) >= self.max_pending:
+                return None
+            job_id = str(uuid.uuid4())
+            self._jobs[job_id] = {'status': 'pending', 'result': None, 'error': None,
+                                  'progress': None, 'created': time.time(), 'finished': None}
+        self._executor.submit(self._run, job_id, fn, *args)
+        return job_id
+
+    def _run(self, job_id, fn, *args):
+        job = self._jobs[job_id]
+        job['status'] = 'running'
+        try:
+            job['result'] = fn(*args, progress=lambda value: job.update(progress=value))
+            job['status'] = 'done'
+        except Exception as e:
+            logger.exception('Job %s failed', job_id)
+            job['error'] = str(e)
+            job['status'] = 'failed'
+        job['finished'] = time.time()
+
+    def status(self, job_id):
+        """Method that returns the status of a job, or None if it is unknown."""
+        with self._guard:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def position(self, job_id):
+        """Method that returns how many jobs are queued before a pending job."""
+        with self._guard:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != 'pending':
+                return 0
+            return sum(j['status'] == 'pending' and j['created'] < job['created']
+                       for j in self._jobs.values())
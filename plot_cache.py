@@ -0,0 +1,31 @@
+class PlotCache:
+    """Cache of the serialized figures of each session. Every figure is kept on
+    its own under (session, field, option, combination), so concurrent plot
+    callbacks never rewrite each other's figures."""
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def name(field, option, combination):
+        """Method that returns the artifact name of a figure."""
+        return 'plot-{}-{}-{}'.format(field, option, combination)
+
+    def get(self, session_id, field, option, combination):
+        """Method that returns a serialized figure, or None if not yet generated."""
+        return self.store.get(session_id, self.name(field, option, combination))
+
+    def set(self, session_id, field, option, combination, fig):
+        """Method that stores a serialized figure."""
+        if fig is not None:
+            self.store.set(session_id, self.name(field, option, combination), fig)
+
+    def get_many(self, session_id, field, option, count):
+        """Method that returns the figures of all combinations, or None if any is missing."""
+        figs = [self.get(session_id, field, option, c) for c in range(count)]
+        return None if any(fig is None for fig in figs) else figs
+
+    def set_many(self, session_id, field, option, figs):
+        """Method that stores the figures of all combinations."""
+        for c, fig in enumerate(figs):
+            self.set(session_id, field, option, c, fig)
@@ -1,26 +1,26 @@
 import pandas as pd
 import plotly.express as px
-from wordcloud import WordCloud, STOPWORDS
+import plotly.graph_objects as go
 from geopandas import GeoDataFrame
 from shapely.geometry import box
-from folium.plugins import MarkerCluster, Fullscreen
+from folium.plugins import FastMarkerCluster, Fullscreen
 import folium
-from folium import IFrame
 from folium.plugins import HeatMap
 import re
 from clustering import cluster_shapes, compute_clusters
-import base64
-from io import BytesIO
-import matplotlib.pyplot as plt
-from numpy import around
+from geogrid import grid_cells, grid_layer, heat_points
+from wordclouds import wordclouds
+from content_store import contents
 from shapely.geometry import Point
 from collections import Counter
-from numpy import ones
-import scipy
+from binning import bin_edges, histogram, box_stats
+from numpy import isnan, asarray, unique, full, nan, nanmean
+from warnings import catch_warnings, simplefilter
+import config
+from rank_stats import score_matrix, pearson_matrix, spearman_matrix, kendall_matrix, rbo_matrix, jaccard_matrix, RBO_P, TOP_K
 import dash
 import json
 from plotly.io import from_json, to_json
-from filelock import FileLock
 
 
 def fetch_map():
@@ -36,52 +36,74 @@ def fetch_map():
     return home_m
 
 
-def __fetch_star(no):
-    """Method that generates a ranking system for entities for spatial plots."""
-    r = around(no, 1) / 0.2
-    s = ""
-    i = 0
-    while r > 0:
-        if r >= 1.0:
-            s += '<span class="fa fa-star checked"></span>'
-        else:
-            s += '<span class="fa fa-star-half-o checked"></span>'
-        i+=1
-        r -= 1.0
-    s += '<span class="fa fa-star-o checked"></span>' * (5-i)
-    return s
+# Builds the marker of a POI row [lat, lon, name, *scores] in the browser,
+# with its popup rendered only when it is opened
+POI_CALLBACK = """function (row) {
+    var keys = %s;
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(function () {
+        var pop = '<table style="width:200px"> <tr> <th colspan="3" style="text-align:center" >' + row[2] + '</th> </tr>';
+        for (var k = 0; k < keys.length; k++) {
+            var s = row[k + 3];
+            if (s === null) continue;
+            var r = Math.round(s * 10) / 10 / 0.2, stars = '', i = 0;
+            for (; r > 0; i++, r -= 1.0)
+                stars += r >= 1.0 ? '<span class="fa fa-star checked"></span>' : '<span class="fa fa-star-half-o checked"></span>';
+            for (; i < 5; i++)
+                stars += '<span class="fa fa-star-o checked"></span>';
+            pop += '<tr> <td> ' + keys[k] + ' </td> <td> ' + stars + ' </td> <td> ' + s.toFixed(2) + '</td> </tr>';
+        }
+        return pop + '</table>';
+    }, {maxWidth: 300});
+    return marker;
+}"""
 
-def __prepare_popup(r):
-    """Method that generates the popup that will contain the raking system for spatial plots."""
-    pop = '<table style="width:200px"> <tr> <th colspan="3" style="text-align:center" >{}</th> </tr>'.format(r['name'])
-    for key in r.keys():
-        if key.endswith('score'):
-            pop += '<tr> <td> {} </td> <td> {} </td> <td> {:.2f}</td> </tr>'.format(key, __fetch_star(r[key]), r[key])
-            
-    return folium.Popup(pop, width=300)
 
-def return_var_plot(result, attr_name, attr_type, option=0):
+def __poi_rows(result, rows, pois):
+    """Method that packs the POIs with the name and scores shown in their popups
+    into compact rows, returning the score keys and the rows."""
+    keys = [key for key in result.keys() if key.endswith('score')]
+    cols = [pois[:, 1].tolist(), pois[:, 0].tolist(), [result['name'][i] for i in rows]]
+    for key in keys:
+        cols.append([None if x != x else round(x, 3) for x in result[key][rows].tolist()])
+    return keys, [list(row) for row in zip(*cols)]
+
+def return_var_plot(result, attr_name, attr_type, option=0, edges=None, key=None):
     """Method that generates the corresponding plot for each attribute, based 
-    on the type and the selection of the user."""
+    on the type and the selection of the user, from the columns of the results.
+    Histograms use the given bin edges, so combinations can be compared, and
+    the clusters of the POIs are cached under the given key."""
     aval = f'{attr_name}_value'
     if attr_type == 'NUMBER' or attr_type == 'DATE_TIME':
-        if aval not in result[0].keys():
+        if aval not in result:
             return None
-        vals = [r[aval] for r in result]
         if option == 0:
-            fig = px.histogram(x=vals)
+            x, widths, counts = histogram(result[aval], edges)
+            fig = go.Figure(go.Bar(x=x, y=counts, width=widths))
+            fig.update_layout(bargap=0)
             fig.update_yaxes(title='Frequency')
         elif option == 1:
-            fig = px.box(x=vals)
+            stats = box_stats(result[aval])
+            fig = go.Figure()
+            if stats is not None:
+                outliers = stats.pop('outliers')
+                fig.add_trace(go.Box(y=[0], orientation='h', boxmean=True, **stats))
+                fig.add_trace(go.Scatter(x=outliers, y=[0]*len(outliers), mode='markers'))
+            fig.update_layout(showlegend=False)
+            fig.update_yaxes(showticklabels=False)
         fig.update_xaxes(title=attr_name.capitalize())            
         return fig
     elif attr_type == 'GEOLOCATION': #location
-        if aval not in result[0].keys():
+        if aval not in result:
             return None    
     
-        pois = [tuple(map(float, r[aval][7:-1].split(' '))) for r in result]
-        x, y = zip(*pois)
-        minx, miny, maxx, maxy = min(x), min(y), max(x), max(y)
+        found = ~isnan(result[aval]).any(axis=1)
+        rows = found.nonzero()[0]
+        pois = result[aval][found]
+        if len(pois) == 0:
+            return None
+        x, y = pois[:, 0], pois[:, 1]
+        minx, miny, maxx, maxy = x.min(), y.min(), x.max(), y.max()
         
         bb = box(minx, miny, maxx, maxy)
         map_center = [bb.centroid.y, bb.centroid.x]
@@ -90,36 +112,41 @@ def return_var_plot(result, attr_name, attr_type, option=0):
         m.add_child(Fullscreen())
         
         if option == 0:
-            coords, popups = [], []
+            keys, data = __poi_rows(result, rows, pois)
             poi_layer = folium.FeatureGroup(name='pois')
-            for r, yy, xx in zip(result, y, x):
-                coords.append([yy, xx])
-                popups.append(__prepare_popup(r))
-            poi_layer.add_child(MarkerCluster(locations=coords, popups=popups))
+            poi_layer.add_child(FastMarkerCluster(data, callback=POI_CALLBACK % json.dumps(keys)))
             m.add_child(poi_layer)    
             folium.GeoJson(bb).add_to(m)
         elif option == 1:
-            scores = [r['score'] for r in result]
-            HeatMap(zip(y,x,scores), radius=10).add_to(m)  
+            scores = result['score'][found]
+            if config.heatmap_mode == 'points':
+                HeatMap(zip(y.tolist(),x.tolist(),scores.tolist()), radius=10).add_to(m)  
+            elif config.heatmap_mode == 'grid':
+                layer, colormap = grid_layer(grid_cells(x, y, scores))
+                layer.add_to(m)
+                colormap.caption = 'Mean score'
+                colormap.add_to(m)
+            else:
+                HeatMap(heat_points(grid_cells(x, y, scores)), radius=15).add_to(m)
         elif option == 2:
-            if 'keywords_value' not in result[0].keys():
+            if 'keywords_value' not in result:
                 return None
             
             
-            kwds = [r['keywords_value'] for r in result]
-            scores = [r['score'] for r in result]
+            kwds = [result['keywords_value'][i] for i in rows]
+            scores = result['score'][found]
             
 
-            labels, eps = compute_clusters(pois)
+            labels, eps = compute_clusters(pois, key)
             
-            pois = [Point(poi) for poi in pois]
+            pois = [Point(poi) for poi in pois.tolist()]
             d = {'geometry': pois, 'kwd': kwds, 'score': scores, 'cluster_id': labels}
             gdf = GeoDataFrame(d, crs="EPSG:4326")
             gdf = gdf[gdf.cluster_id >= 0]
             
             aois = cluster_shapes(gdf, eps).set_index('cluster_id')
             
-            means = gdf.groupby('cluster_id').agg({'score': 'mean', 'kwd': lambda x: ' '.join(x)})
+            means = gdf.groupby('cluster_id').agg({'score': 'mean'})
             clustered_keys = pd.concat([aois, means], axis=1).reset_index(drop=False)
             
             bins = list(clustered_keys['score'].quantile([0, 0.25, 0.5, 0.75, 1]))
@@ -130,43 +157,32 @@ def return_var_plot(result, attr_name, attr_type, option=0):
                               fill_color='YlOrRd', fill_opacity=0.6,
                               line_opacity=0.5).add_to(m)
             
-            wc = WordCloud(width = 200, height = 150, random_state=1,
-                       background_color='salmon', colormap='Pastel1',
-                       collocations=False, stopwords = STOPWORDS)
+            counters = {}
+            for cid, kwd in zip(gdf.cluster_id.tolist(), gdf.kwd.tolist()):
+                counters.setdefault(cid, Counter()).update(kwd or [])
+            counters = [counters[cid] for cid in clustered_keys['cluster_id'].tolist()]
+            images = [contents.put(png, 'png') for png in wordclouds.png_many(counters, 200, 150)]
             
-            for index, row in clustered_keys.iterrows():
-                c = Counter(row['kwd'])
-                s = wc.generate_from_frequencies(c)
-                plt.imshow(s, interpolation='bilinear')
-                plt.axis("off")
-                buf = BytesIO()
-                plt.savefig(buf, format='png', bbox_inches='tight')
-                # Include image popup to the marker
-                html = '<img src="data:image/PNG;base64,{}" style="width:100%; height:100%; display:block">'.format
-                encoded = base64.b64encode(buf.getvalue()).decode()
-                iframe = IFrame(html(encoded), width=300, height=150)
-                popup = folium.Popup(iframe, min_width=300, max_width=300, parse_html=True) # max_width=2650
-                buf.close()
+            html = '<img src="{}" style="width:300px; height:150px; display:block">'.format
+            for geometry, url in zip(clustered_keys['geometry'], images):
+                # Include image popup to the marker, resolved against the map document
+                popup = folium.Popup(html(url), min_width=300, max_width=300) # max_width=2650
                 
-                folium.GeoJson(row['geometry']).add_child(popup).add_to(m)
+                folium.GeoJson(geometry).add_child(popup).add_to(m)
         return m.get_root().render()
     
     
     elif attr_type == 'KEYWORD_SET':
-        if aval not in result[0].keys():
+        if aval not in result:
             return None    
     
-        wc = WordCloud(width = 400, height = 300, random_state=1,
-                       background_color='salmon', colormap='Pastel1',
-                       collocations=False, stopwords = STOPWORDS)
-        
         c = Counter()
-        for r in result:
-            c.update(r[aval])
-        s = wc.generate_from_frequencies(c)
+        for vals in result[aval]:
+            if vals:
+                c.update(vals)
         
         if option == 0:
-            fig = px.imshow(s, labels={})
+            fig = px.imshow(asarray(wordclouds.render(c, 400, 300)), labels={})
             fig.update_xaxes(showticklabels=False)
             fig.update_yaxes(showticklabels=False)
             fig.update_traces(hovertemplate=None, hoverinfo='skip' )
@@ -178,81 +194,134 @@ def return_var_plot(result, attr_name, attr_type, option=0):
             fig.update_yaxes(title=None)
             return fig
         
+def similarity_matrix(pairs):
+    """Method that builds the dense similarity matrix of the results from the
+    left/right pairs, with rows and columns in the order of their labels."""
+    left = [p['left'] for p in pairs]
+    right = [p['right'] for p in pairs]
+    score = [p['score'] for p in pairs]
+    rows, li = unique(left, return_inverse=True)
+    cols, ri = unique(right, return_inverse=True)
+    s = full((len(rows), len(cols)), nan)
+    s[li.ravel(), ri.ravel()] = asarray(score, dtype=float)
+    return s
+
+
+def block_average(s, size):
+    """Method that averages a matrix over square blocks so that neither side
+    exceeds size cells, returning it with the block side (0 disables it)."""
+    step = -(-max(s.shape) // size) if size else 1
+    if step <= 1:
+        return s, 1
+    h, w = -(-s.shape[0] // step), -(-s.shape[1] // step)
+    padded = full((h * step, w * step), nan)
+    padded[:s.shape[0], :s.shape[1]] = s
+    with catch_warnings():
+        simplefilter('ignore', category=RuntimeWarning)
+        return nanmean(padded.reshape(h, step, w, step), axis=(1, 3)), step
+
+
+# Number of inter-combination plots: Pearson, Spearman, Kendall, RBO & Jaccard@k
+INTER_PLOTS = 5
+
+
 def return_stat_plot(data, sel, no):
     """Method that generates the general plots of the results."""
     if sel == 1:
         if 'similarityMatrix' not in data[no]:
             return {}
-        s = pd.DataFrame(data[no]['similarityMatrix']).drop_duplicates().pivot(index='left', columns='right', values='score')
-        s = s.reset_index(drop=True)
-        s.columns = range(s.columns.shape[0])
+        s = similarity_matrix(data[no]['similarityMatrix'])
+        s, step = block_average(s, config.heatmap_max_size)
+        ticks = list(range(0, step * s.shape[0], step)), list(range(0, step * s.shape[1], step))
             
-        fig = px.imshow(s, labels=dict(x="Results", y="Results", color="Score"),)
+        fig = px.imshow(s, x=ticks[1], y=ticks[0], labels=dict(x="Results", y="Results", color="Score"),)
         fig.update_layout(title_text='Weight Combination {}'.format(no+1), title_x=0.5)
         return fig
     elif sel == 2:
-        df2 = pd.concat([pd.DataFrame([[x['id'],x['score']] for x in data[i]['rankedResults']]).set_index(0)[1] for i in range(no)],
-                        axis=1, keys=range(no))
-
-        pearsonr = ones((no, no))
-        spearmanr = ones((no, no))
-        kendalltau = ones((no, no))
-        
-        for i in range(no):
-            for j in range(i+1,no):
-                z = df2[[i, j]].dropna(how='all').fillna(0).values.T
-                pearsonr[i,j] = pearsonr[j,i] = scipy.stats.pearsonr(z[0], z[1])[0]
-                spearmanr[i,j] = spearmanr[j,i] = scipy.stats.spearmanr(z[0], z[1])[0]
-                kendalltau[i,j] = kendalltau[j,i] = scipy.stats.kendalltau(z[0], z[1])[0]
-        
-        
+        X, P, ids = score_matrix(data[:no])
+        matrices = [pearson_matrix(X, P), spearman_matrix(X, P), kendall_matrix(X, P),
+                    rbo_matrix(ids), jaccard_matrix(ids)]
         
         t1 = '<a href = "https://en.wikipedia.org/wiki/Pearson_correlation_coefficient/">Pearson Correlation</a>'
         t2 = '<a href = "https://en.wikipedia.org/wiki/Spearman%27s_rank_correlation_coefficient/">Spearman Correlation</a>'
         t3 = '<a href = "https://en.wikipedia.org/wiki/Kendall_rank_correlation_coefficient/">Kendall Correlation</a>'
+        t4 = '<a href = "https://doi.org/10.1145/1852102.1852106">Rank-Biased Overlap (p={})</a>'.format(RBO_P)
+        t5 = '<a href = "https://en.wikipedia.org/wiki/Jaccard_index">Jaccard@{}</a>'.format(TOP_K)
         
+        figs = []
+        for matrix, title in zip(matrices, [t1, t2, t3, t4, t5]):
+            fig = px.imshow(matrix, labels=dict(x="Listing", y="Listing", color="Score"))
+            fig.update_xaxes(showticklabels=False)
+            fig.update_yaxes(showticklabels=False)
+            fig.update_layout(title_text=title, title_x=0.5)
+            figs.append(fig)
         
-        fig1 = px.imshow(pearsonr, labels=dict(x="Listing", y="Listing", color="Score"))
-        fig1.update_xaxes(showticklabels=False)
-        fig1.update_yaxes(showticklabels=False)
-        fig1.update_layout(title_text=t1, title_x=0.5)
-        
-        fig2 = px.imshow(spearmanr, labels=dict(x="Listing", y="Listing", color="Score"))
-        fig2.update_xaxes(showticklabels=False)
-        fig2.update_yaxes(showticklabels=False)
-        fig2.update_layout(title_text=t2, title_x=0.5)
-        
-        fig3 = px.imshow(kendalltau, labels=dict(x="Listing", y="Listing", color="Score"))
-        fig3.update_xaxes(showticklabels=False)
-        fig3.update_yaxes(showticklabels=False)
-        fig3.update_layout(title_text=t3, title_x=0.5)  
-        
-        return [fig1, fig2, fig3]
+        return figs
         
  
-def update_plots_general(sel, field, attr_name, attr_type, session_id):
+def stat_plots(session_id, store, plots):
+    """Method that returns or generates the statistics plots of all combinations."""
+    no = store.count_combinations(session_id)
+    if no is None:
+        return None
+    
+    intra_figs = plots.get_many(session_id, 'stats', 1, no)
+    inter_figs = plots.get_many(session_id, 'stats', 2, INTER_PLOTS)
+    if intra_figs is not None and inter_figs is not None:
+        return [fig_from_json(fig) for fig in intra_figs], [fig_from_json(fig) for fig in inter_figs]
+    
+    data = store.get(session_id, 'data')
+    if data is None:
+        return None
+    intra_figs = [return_stat_plot(data, 1, i) for i in range(no)]
+    inter_figs = return_stat_plot(data, 2, no)
+    
+    plots.set_many(session_id, 'stats', 1, [fig_to_json(fig) for fig in intra_figs])
+    plots.set_many(session_id, 'stats', 2, [fig_to_json(fig) for fig in inter_figs])
+    return intra_figs, inter_figs
+
+
+def shared_edges(session_id, store, attr_name, attr_type):
+    """Method that computes the histogram bin edges of a field over all
+    combinations, or None if the field is not binned."""
+    if attr_type not in ('NUMBER', 'DATE_TIME'):
+        return None
+    columns = [store.get_column(session_id, w, 'rankedResults', f'{attr_name}_value')
+               for w in range(store.count_combinations(session_id) or 0)]
+    return bin_edges([col for col in columns if col is not None])
+
+
+def plot_general(sel, field, w, attr_name, attr_type, session_id, store, plots, edges=None):
+    """Method that returns or generates the plot of a single combination, or None
+    if the results of the session are gone. Maps are returned as the URL they
+    are served from."""
+    fig = plots.get(session_id, field, sel, w)
+    if fig is not None and (attr_type != 'GEOLOCATION' or contents.exists(fig)):
+        return fig_from_json(fig)
+    data = store.get_combination(session_id, w)
+    if data is None:
+        return None
+    fig = return_var_plot(data['rankedResults'], attr_name, attr_type, sel, edges, (session_id, w))
+    if isinstance(fig, str):
+        fig = contents.put(fig, 'html')
+    fig = fig if fig is not None else dash.no_update
+    plots.set(session_id, field, sel, w, fig_to_json(fig))
+    return fig
+
+
+def update_plots_general(sel, field, attr_name, attr_type, session_id, store, plots):
     """Method that returns or generates a general plot."""
-    with open('output/plots_{}.json'.format(session_id), 'r') as f:
-        plots = json.load(f)
-    if plots[1][field][sel][0] is not None:
-        return [fig_from_json(fig) for fig in plots[1][field][sel]]
+    no = store.count_combinations(session_id)
+    if no is None:
+        return None
     
-    with open('output/data_{}.json'.format(session_id)) as f:
-        data = json.load(f)
-    no = len(data)
+    edges = shared_edges(session_id, store, attr_name, attr_type) if sel == 0 else None
     figs = []
     for w in range(no):
-        fig = return_var_plot(data[w]['rankedResults'], attr_name, attr_type, sel)
-        figs.append(fig if fig is not None else dash.no_update)
-
-
-    lock = FileLock("output/locks_{}.lock".format(session_id))
-    with lock:
-        with open('output/plots_{}.json'.format(session_id), 'r') as f:
-            plots = json.load(f)
-        plots[1][field][sel] = [fig_to_json(fig) for fig in figs]
-        with open('output/plots_{}.json'.format(session_id), 'w') as f:
-            json.dump(plots, f, indent=4)
+        fig = plot_general(sel, field, w, attr_name, attr_type, session_id, store, plots, edges)
+        if fig is None:
+            return None
+        figs.append(fig)
         
     return figs
 
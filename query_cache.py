@@ -0,0 +1,66 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from session_store import sizeof
+import config
+
+
+def query_key(source, params, attr):
+    """Method that returns the canonical hash of a SimSearch query on a source."""
+    body = {'url': source['simsearch_url'], 'api': source['simsearch_api'],
+            'params': params, 'attr': attr}
+    body = json.dumps(body, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class QueryCache:
+    """LRU cache of flattened SimSearch results with TTL and size-based eviction."""
+
+    def __init__(self, budget=config.query_cache_budget, ttl=config.query_cache_ttl):
+        self.budget = budget
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._guard = threading.Lock()
+
+    def get(self, key):
+        """Method that returns the cached results of a query, or None."""
+        with self._guard:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[2] > self.ttl:
+                self.size -= entry[1]
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, results):
+        """Method that caches the results of a query."""
+        size = sizeof(results)
+        if size > self.budget:
+            return
+        with self._guard:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (results, size, time.time())
+            self.size += size
+            now = time.time()
+            while self._entries:
+                key, (value, size, created) = next(iter(self._entries.items()))
+                if self.size <= self.budget and now - created <= self.ttl:
+                    break
+                del self._entries[key]
+                self.size -= size
+
+    def stats(self):
+        """Method that returns the counters of the cache."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._entries), 'bytes': self.size}
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+RBO_P = 0.9
+TOP_K = 10
+
+
+def score_matrix(combinations):
+    """Method that aligns the scores of the combinations by entity, returning the
+    scores (0 where an entity is missing), the presence mask and the id lists."""
+    ids = [list(c['rankedResults']['id']) for c in combinations]
+    index, inverse = np.unique(np.array(sum(ids, []), dtype=object), return_inverse=True)
+    X = np.zeros((len(index), len(ids)))
+    P = np.zeros((len(index), len(ids)), dtype=bool)
+    start = 0
+    for i, c in enumerate(combinations):
+        rows = inverse[start:start + len(ids[i])]
+        X[rows, i] = c['rankedResults']['score']
+        P[rows, i] = True
+        start += len(ids[i])
+    return X, P, ids
+
+
+def _pair_counts(P):
+    """Method that returns the number of entities present in either of each pair."""
+    P = P.astype(float)
+    n = P.sum(axis=0)
+    return n, n[:, None] + n[None, :] - P.T @ P
+
+
+def _correlation(N, S, SS, SP):
+    """Method that returns the Pearson correlations from the pairwise sums."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = SP - S * S.T / N
+        var = SS - S ** 2 / N
+        r = cov / np.sqrt(var * var.T)
+    np.fill_diagonal(r, 1)
+    return r
+
+
+def pearson_matrix(X, P):
+    """Method that returns the Pearson correlations of all pairs of combinations,
+    each pair over the entities present in either of them."""
+    n, N = _pair_counts(P)
+    S = np.broadcast_to(X.sum(axis=0)[:, None], N.shape)
+    SS = np.broadcast_to((X ** 2).sum(axis=0)[:, None], N.shape)
+    return _correlation(N, S, SS, X.T @ X)
+
+
+def spearman_matrix(X, P):
+    """Method that returns the Spearman correlations of all pairs of combinations.
+    Within a pair the missing entities tie with the zero scores below all others
+    (scores are non-negative), so every rank is the rank among the positive
+    scores shifted by a per-pair constant, and all pairs follow from a few
+    products of the rank matrix."""
+    n, N = _pair_counts(P)
+    F = P & (X > 0)
+    R = pd.DataFrame(np.where(F, X, np.nan)).rank().fillna(0).to_numpy()
+    F = F.astype(float)
+    nf = F.sum(axis=0)[:, None]
+    C = (N - nf - 1) / 2
+    Ri, Qi = R.sum(axis=0)[:, None], (R ** 2).sum(axis=0)[:, None]
+    S = Ri + nf * C
+    SS = Qi + 2 * C * Ri + nf * C ** 2
+    SP = R.T @ R + C.T * (R.T @ F) + C * (F.T @ R) + C * C.T * (F.T @ F)
+    return _correlation(N, S, SS, SP)
+
+
+def _inversions(y):
+    """Method that counts the pairs i < j with y[i] > y[j] of dense ranks,
+    merging sorted blocks of doubling size."""
+    n, count, w = len(y), 0, 1
+    positions = np.arange(n)
+    while w < n:
+        block = positions // w
+        keys = np.sort(block * n + y)
+        right = block % 2 == 1
+        start = block[right] * w
+        below = np.searchsorted(keys, (block[right] - 1) * n + y[right], side='right')
+        count += int((start - below).sum())
+        w *= 2
+    return count
+
+
+def _ties(*arrays):
+    """Method that returns the number of pairs tied in all the arrays, which are
+    sorted together."""
+    change = np.any([a[1:] != a[:-1] for a in arrays], axis=0)
+    counts = np.diff(np.flatnonzero(np.r_[True, change, True]))
+    return int((counts * (counts - 1) // 2).sum())
+
+
+def kendall_tau(x, y):
+    """Method that returns the Kendall tau-b of two arrays in O(n log n)."""
+    n = len(x)
+    order = np.lexsort((y, x))
+    x, y = x[order], y[order]
+    xtie = _ties(x)
+    ntie = _ties(x, y)
+    ytie = _ties(np.sort(y))
+    dis = _inversions(np.unique(y, return_inverse=True)[1].ravel())
+    tot = n * (n - 1) // 2
+    if xtie == tot or ytie == tot:
+        return np.nan
+    return (tot - xtie - ytie + ntie - 2 * dis) / np.sqrt(tot - xtie) / np.sqrt(tot - ytie)
+
+
+def kendall_matrix(X, P):
+    """Method that returns the Kendall correlations of all pairs of combinations."""
+    no = X.shape[1]
+    tau = np.ones((no, no))
+    for i in range(no):
+        for j in range(i+1, no):
+            rows = P[:, i] | P[:, j]
+            tau[i, j] = tau[j, i] = kendall_tau(X[rows, i], X[rows, j])
+    return tau
+
+
+def _overlaps(s, t):
+    """Method that returns the overlap of the prefixes of two id lists at every depth."""
+    depth = min(len(s), len(t))
+    pos = {}
+    for d, x in enumerate(s[:depth]):
+        pos[x] = d
+    seen = np.array([max(pos[x], d) for d, x in enumerate(t[:depth]) if x in pos], dtype=int)
+    return np.cumsum(np.bincount(seen, minlength=depth))
+
+
+def rbo_matrix(ids, p=RBO_P):
+    """Method that returns the extrapolated rank-biased overlap of all pairs of lists."""
+    no = len(ids)
+    rbo = np.ones((no, no))
+    for i in range(no):
+        for j in range(i+1, no):
+            X = _overlaps(ids[i], ids[j])
+            if len(X) == 0:
+                rbo[i, j] = rbo[j, i] = 0
+                continue
+            d = np.arange(1, len(X) + 1)
+            rbo[i, j] = rbo[j, i] = X[-1] / d[-1] * p ** d[-1] + (1 - p) / p * (X / d * p ** d).sum()
+    return rbo
+
+
+def jaccard_matrix(ids, k=TOP_K):
+    """Method that returns the Jaccard similarity of the top-k of all pairs of lists."""
+    tops = [set(s[:k]) for s in ids]
+    no = len(ids)
+    jac = np.ones((no, no))
+    for i in range(no):
+        for j in range(i+1, no):
+            union = len(tops[i] | tops[j])
+            jac[i, j] = jac[j, i] = len(tops[i] & tops[j]) / union if union else 1
+    return jac
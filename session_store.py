@@ -0,0 +1,361 @@
+import abc
+import json
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from filelock import FileLock
+import numpy as np
+import columnar
+import config
+
+
+def sizeof(obj):
+    """Method that estimates the memory footprint of a json-like object."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, np.ndarray):
+        return size + obj.nbytes
+    if isinstance(obj, dict):
+        size += sum(sizeof(k) + sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(sizeof(v) for v in obj)
+    return size
+
+
+class SessionStore(abc.ABC):
+    """Base class for keeping the artifacts (results, figures) of each session."""
+
+    def __init__(self):
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._accessed = {}
+
+    def touch(self, session_id):
+        """Method that records an access to a session."""
+        self._accessed[session_id] = time.time()
+
+    def last_access(self, session_id):
+        """Method that returns the time of the last access to a session in this process."""
+        return self._accessed.get(session_id)
+
+    @abc.abstractmethod
+    def get(self, session_id, name):
+        """Method that returns an artifact of a session, or None if it is missing."""
+
+    @abc.abstractmethod
+    def set(self, session_id, name, value):
+        """Method that stores an artifact of a session."""
+
+    def get_combination(self, session_id, no):
+        """Method that returns a single weight combination of the results of a session."""
+        data = self.get(session_id, 'data')
+        return data[no] if data is not None else None
+
+    def get_column(self, session_id, no, table, name):
+        """Method that returns a single column of a table of a weight combination,
+        or None if it is missing."""
+        comb = self.get_combination(session_id, no)
+        if comb is None or not isinstance(comb.get(table), dict):
+            return None
+        return comb[table].get(name)
+
+    def count_combinations(self, session_id):
+        """Method that returns the number of weight combinations of a session."""
+        data = self.get(session_id, 'data')
+        return len(data) if data is not None else None
+
+    def delete(self, session_id):
+        """Method that removes all artifacts of a session."""
+        self._accessed.pop(session_id, None)
+        with self._locks_guard:
+            self._locks.pop(session_id, None)
+
+    def lock(self, session_id):
+        """Method that returns the lock guarding the read-modify-write of a session."""
+        with self._locks_guard:
+            if session_id not in self._locks:
+                self._locks[session_id] = threading.RLock()
+            return self._locks[session_id]
+
+
+class MemoryStore(SessionStore):
+    """In-process LRU store with a memory budget and TTL eviction. If a backend
+    store is given, writes go through to it and misses are reloaded from it."""
+
+    def __init__(self, budget=config.session_memory_budget, ttl=config.session_ttl, backend=None):
+        super().__init__()
+        self.budget = budget
+        self.ttl = ttl
+        self.backend = backend
+        self.size = 0
+        self._entries = OrderedDict()
+        self._guard = threading.Lock()
+
+    def _evict(self):
+        now = time.time()
+        while self._entries:
+            key, (value, size, accessed) = next(iter(self._entries.items()))
+            if self.size <= self.budget and now - accessed <= self.ttl:
+                break
+            del self._entries[key]
+            self.size -= size
+
+    def _put(self, key, value):
+        size = sizeof(value)
+        with self._guard:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if size <= self.budget:
+                self._entries[key] = (value, size, time.time())
+                self.size += size
+            self._evict()
+
+    def get(self, session_id, name):
+        self.touch(session_id)
+        key = (session_id, name)
+        with self._guard:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[2] > self.ttl:
+                self.size -= entry[1]
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], time.time())
+                self._entries.move_to_end(key)
+                return entry[0]
+        if self.backend is None:
+            return None
+        value = self.backend.get(session_id, name)
+        if value is not None:
+            self._put(key, value)
+        return value
+
+    def _cached(self, session_id, name):
+        with self._guard:
+            entry = self._entries.get((session_id, name))
+            return entry[0] if entry is not None else None
+
+    def get_combination(self, session_id, no):
+        self.touch(session_id)
+        if self.backend is None or self._cached(session_id, 'data') is not None:
+            return super().get_combination(session_id, no)
+        return self.backend.get_combination(session_id, no)
+
+    def get_column(self, session_id, no, table, name):
+        self.touch(session_id)
+        if self.backend is None or self._cached(session_id, 'data') is not None:
+            return super().get_column(session_id, no, table, name)
+        return self.backend.get_column(session_id, no, table, name)
+
+    def count_combinations(self, session_id):
+        if self.backend is None or self._cached(session_id, 'data') is not None:
+            return super().count_combinations(session_id)
+        return self.backend.count_combinations(session_id)
+
+    def set(self, session_id, name, value):
+        self.touch(session_id)
+        if self.backend is not None:
+            self.backend.set(session_id, name, value)
+        self._put((session_id, name), value)
+
+    def delete(self, session_id):
+        with self._guard:
+            for key in [key for key in self._entries if key[0] == session_id]:
+                self.size -= self._entries.pop(key)[1]
+        if self.backend is not None:
+            self.backend.delete(session_id)
+        super().delete(session_id)
+
+    def lock(self, session_id):
+        if self.backend is not None:
+            return self.backend.lock(session_id)
+        return super().lock(session_id)
+
+
+class SessionLock:
+    """Lock that holds a thread lock and a file lock together."""
+
+    def __init__(self, thread_lock, file_lock):
+        self.thread_lock = thread_lock
+        self.file_lock = file_lock
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        try:
+            self.file_lock.acquire()
+        except BaseException:
+            self.thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self.file_lock.release()
+        self.thread_lock.release()
+
+
+class DiskStore(SessionStore):
+    """Store that keeps each artifact in the output directory: the results
+    ('data') in the columnar format, everything else as a json file."""
+
+    def __init__(self, directory=config.output_dir):
+        super().__init__()
+        self.directory = directory
+
+    def path(self, session_id, name):
+        """Method that returns the file (or directory) of an artifact."""
+        if name == 'data':
+            return os.path.join(self.directory, 'data_{}'.format(session_id))
+        return os.path.join(self.directory, '{}_{}.json'.format(name, session_id))
+
+    def get(self, session_id, name):
+        try:
+            if name == 'data':
+                return columnar.read_results(self.path(session_id, name))
+            with open(self.path(session_id, name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get_combination(self, session_id, no):
+        try:
+            return columnar.read_combination(self.path(session_id, 'data'), no)
+        except FileNotFoundError: # removed by the janitor while reading
+            return None
+
+    def get_column(self, session_id, no, table, name):
+        meta = columnar.read_meta(self.path(session_id, 'data'))
+        if meta is None:
+            return None
+        columns = meta['combinations'][no]['tables'].get(table, {}).get('columns', [])
+        if name not in [c['name'] for c in columns]:
+            return None
+        try:
+            return columnar.read_column(self.path(session_id, 'data'), no, table, name, meta)
+        except FileNotFoundError: # removed by the janitor while reading
+            return None
+
+    def count_combinations(self, session_id):
+        meta = columnar.read_meta(self.path(session_id, 'data'))
+        return len(meta['combinations']) if meta is not None else None
+
+    def set(self, session_id, name, value):
+        path = self.path(session_id, name)
+        if name == 'data':
+            # the results span several files, other artifacts are replaced atomically
+            with self.lock(session_id):
+                columnar.write_results(path, value)
+            return
+        tmp = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+        with open(tmp, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+    def delete(self, session_id):
+        for f in os.listdir(self.directory):
+            if f.split('.')[0].endswith('_{}'.format(session_id)):
+                path = os.path.join(self.directory, f)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif os.path.exists(path):
+                    os.remove(path)
+        super().delete(session_id)
+
+    def lock(self, session_id):
+        # a FileLock only excludes other processes, the threads of this one
+        # share it, so it is paired with a thread lock
+        with self._locks_guard:
+            if session_id not in self._locks:
+                path = os.path.join(self.directory, 'locks_{}.lock'.format(session_id))
+                self._locks[session_id] = SessionLock(threading.RLock(), FileLock(path))
+            return self._locks[session_id]
+
+
+class LocalCache:
+    """Local stand-in for a shared cache server, implementing the subset of the
+    redis client interface used by SharedStore."""
+
+    def __init__(self):
+        self._data = {}
+        self._guard = threading.Lock()
+
+    def get(self, key):
+        with self._guard:
+            value, expires = self._data.get(key, (None, None))
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._guard:
+            self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._guard:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def keys(self, pattern='*'):
+        prefix = pattern.rstrip('*')
+        with self._guard:
+            return [key for key in self._data if key.startswith(prefix)]
+
+    def lock(self, name, timeout=None):
+        with self._guard:
+            if name not in self._data:
+                self._data[name] = (threading.RLock(), None)
+            return self._data[name][0]
+
+
+class SharedStore(SessionStore):
+    """Store that keeps the artifacts in a shared cache (e.g. redis), so that
+    multiple server processes can serve the same session."""
+
+    def __init__(self, client, ttl=config.session_ttl, prefix='simsearch-ui'):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def key(self, session_id, name):
+        """Method that returns the cache key of an artifact."""
+        return '{}:{}:{}'.format(self.prefix, session_id, name)
+
+    def get(self, session_id, name):
+        value = self.client.get(self.key(session_id, name))
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, session_id, name, value):
+        self.client.set(self.key(session_id, name), pickle.dumps(value), ex=self.ttl)
+
+    def delete(self, session_id):
+        keys = self.client.keys(self.key(session_id, '*'))
+        if keys:
+            self.client.delete(*keys)
+        super().delete(session_id)
+
+    def lock(self, session_id):
+        return self.client.lock(self.key(session_id, 'lock'), timeout=60)
+
+
+def connect(url):
+    """Method that connects to the shared cache of the given url."""
+    if url is None or url.startswith('local://'):
+        return LocalCache()
+    import redis
+    return redis.Redis.from_url(url)
+
+
+def make_store(backend=config.session_backend):
+    """Method that creates the session store of the server."""
+    if backend == 'memory':
+        return MemoryStore()
+    elif backend == 'disk':
+        return MemoryStore(backend=DiskStore())
+    elif backend == 'shared':
+        return MemoryStore(backend=SharedStore(connect(config.shared_cache_url)))
+    raise ValueError('Unknown session backend: {}'.format(backend))
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Latency histogram with fixed buckets (in ms)."""
+    bounds = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float('inf')]
+
+    def __init__(self):
+        self.counts = [0] * len(self.bounds)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, ms):
+        """Method that records a single latency."""
+        self.counts[next(i for i, b in enumerate(self.bounds) if ms <= b)] += 1
+        self.count += 1
+        self.total += ms
+
+    def to_dict(self):
+        """Method that returns the histogram in a json-friendly format."""
+        return {'buckets': {str(b): c for b, c in zip(self.bounds, self.counts)},
+                'count': self.count, 'mean': self.total / self.count if self.count else None}
+
+
+class CircuitBreaker:
+    """Circuit breaker that stops requests to an instance after consecutive
+    failures, letting a single trial request through after a cooldown."""
+
+    def __init__(self, threshold=config.breaker_threshold, cooldown=config.breaker_cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self._guard = threading.Lock()
+
+    def allow(self):
+        """Method that returns whether a request may be sent."""
+        with self._guard:
+            if self.opened is None:
+                return True
+            if time.time() - self.opened >= self.cooldown:
+                self.opened = time.time() # half-open: one trial until it resolves
+                return True
+            return False
+
+    def record(self, success):
+        """Method that records the outcome of a request."""
+        with self._guard:
+            if success:
+                self.failures = 0
+                self.opened = None
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    self.opened = time.time()
+
+
+class SimSearchClient:
+    """HTTP client of a SimSearch instance, with keep-alive connection pooling,
+    timeouts, bounded retries and a circuit breaker."""
+
+    def __init__(self, source, timeout=config.simsearch_timeout,
+                 retries=config.simsearch_retries, pool_size=config.simsearch_pool_size):
+        self.url = source['simsearch_url']
+        self.timeout = timeout
+        self.breaker = CircuitBreaker()
+        self.latency = {}
+        self._guard = threading.Lock()
+        self.session = requests.Session()
+        self.session.headers.update({'api_key': source['simsearch_api'],
+                                     'Content-Type': 'application/json'})
+        retry = Retry(total=retries, connect=retries, read=0, backoff_factor=0.5,
+                      status_forcelist=[502, 503, 504], allowed_methods=False,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, endpoint, json, stream=False):
+        """Method that posts to an endpoint of the instance, returning the
+        response or None if the instance is unreachable. With stream, the
+        body is left unread for the caller to consume incrementally."""
+        if not self.breaker.allow():
+            logger.warning('Circuit open for %s, skipping %s', self.url, endpoint)
+            return None
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url + endpoint, json=json, timeout=self.timeout, stream=stream)
+        except requests.RequestException as e:
+            logger.warning('Request to %s%s failed: %s', self.url, endpoint, e)
+            response = None
+        with self._guard:
+            self.latency.setdefault(endpoint, Histogram()).observe((time.perf_counter() - start) * 1000)
+        self.breaker.record(response is not None and response.status_code < 500)
+        return response
+
+    def stats(self):
+        """Method that returns the latency histograms per endpoint."""
+        with self._guard:
+            return {endpoint: h.to_dict() for endpoint, h in self.latency.items()}
+
+
+_clients = {}
+_clients_guard = threading.Lock()
+
+
+def get_client(source):
+    """Method that returns the shared client of a source."""
+    key = (source['simsearch_url'], source['simsearch_api'])
+    with _clients_guard:
+        if key not in _clients:
+            _clients[key] = SimSearchClient(source)
+        return _clients[key]
@@ -0,0 +1,68 @@
+from data_methods import ColumnBuilder
+
+try:
+    import ijson
+except ImportError: # fall back to parsing the whole body
+    ijson = None
+
+
+def _iter_parsed(combinations, attr):
+    """Method that emits the events of iter_response from an already parsed response."""
+    for no, r in enumerate(combinations):
+        comb = dict(r)
+        if r['rankedResults'] is not None:
+            builder = ColumnBuilder(attr)
+            for row in r['rankedResults']:
+                if builder.append(row):
+                    yield 'row', no, row
+            comb['rankedResults'] = builder.finish()
+        yield 'combination', no, comb
+
+
+def iter_response(response, attr):
+    """Method that incrementally parses a streamed search response. Every ranked
+    result is appended to the columns of its combination as soon as it is read
+    and emitted as ('row', no, result); every complete combination is emitted as
+    ('combination', no, combination), with its rankedResults in the columnar format."""
+    if ijson is None:
+        yield from _iter_parsed(response.json(), attr)
+        return
+
+    response.raw.decode_content = True
+    no, comb, key = -1, None, None
+    builder, depth, target = None, 0, None
+    for prefix, event, value in ijson.parse(response.raw, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+            if depth == 0:
+                if target == 'rankedResults':
+                    if comb['rankedResults'].append(builder.value):
+                        yield 'row', no, builder.value
+                else:
+                    comb[target] = builder.value
+                builder = None
+            continue
+
+        if prefix == '':
+            continue
+        elif prefix == 'item':
+            if event == 'start_map':
+                no, comb = no + 1, {}
+            elif event == 'map_key':
+                key = value
+            elif event == 'end_map':
+                yield 'combination', no, comb
+        elif key == 'rankedResults' and prefix == 'item.rankedResults' and event == 'start_array':
+            comb['rankedResults'] = ColumnBuilder(attr)
+        elif key == 'rankedResults' and prefix == 'item.rankedResults' and event == 'end_array':
+            comb['rankedResults'] = comb['rankedResults'].finish()
+        elif event in ('start_map', 'start_array'):
+            target = key
+            builder, depth = ijson.ObjectBuilder(), 1
+            builder.event(event, value)
+        else:
+            comb[key] = value
@@ -0,0 +1,110 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from suggest_index import tokenize
+import config
+
+
+def _matches(label, names):
+    """Method that checks a label against a tokenized prefix query (see PrefixIndex.search)."""
+    tokens = tokenize(label)
+    if not any(t.startswith(names[0]) for t in tokens):
+        return False
+    return len(names) == 1 or any(t.startswith(n) for n in names[1:] for t in tokens)
+
+
+def _refines(prefix, longer):
+    """Method that checks whether every match of the longer query also matches the prefix."""
+    names, longer_names = tokenize(prefix), tokenize(longer)
+    return longer.startswith(prefix) and len(names) > 0 and \
+        (len(names) == 1 or len(longer_names) == len(names))
+
+
+class SuggestionDispatcher:
+    """Dispatcher of suggestion requests, which coalesces identical in-flight
+    requests, drops the ones superseded by a newer keystroke of the same browser
+    session and answers from a small LRU of recent prefixes shared by all users.
+    A longer prefix is answered by filtering a cached shorter one, if the latter
+    returned all of its matches. Cached prefixes expire after ttl seconds, so
+    that entities added to the sources show up. The latest request is only
+    kept for the most recently active browser sessions."""
+
+    def __init__(self, fetch, size=10, cache_size=1024, sessions=1024, ttl=config.suggest_cache_ttl):
+        self.fetch = fetch
+        self.size = size
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.sessions = sessions
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._latest = OrderedDict()
+        self._seq = itertools.count()
+        self._guard = threading.Lock()
+
+    def _cached(self, key, name):
+        """Method that answers from the LRU, by exact or shorter prefix."""
+        source, name = key
+        for end in range(len(name), 2, -1):
+            entry = self._cache.get((source, name[:end]))
+            if entry is None:
+                continue
+            results, complete, stored = entry
+            if time.time() - stored > self.ttl:
+                del self._cache[(source, name[:end])]
+                continue
+            if end == len(name):
+                self._cache.move_to_end((source, name))
+                return results
+            if complete and _refines(name[:end], name):
+                names = tokenize(name)
+                return [(id, label) for id, label in results if _matches(label, names)]
+        return None
+
+    def _store(self, key, results):
+        self._cache[key] = (results, len(results) < self.size, time.time())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def superseded(self, browser_id, seq):
+        """Method that checks whether a newer request of the browser session arrived."""
+        latest = self._latest.get(browser_id)
+        return latest is not None and latest != seq
+
+    def suggest(self, browser_id, name, source, **kwargs):
+        """Method that returns the suggestions of a prefix, or None if the request
+        was superseded by a newer one of the same browser session. Keyword
+        arguments are passed to the fetch method."""
+        key = (source.get('name'), name.lower())
+        with self._guard:
+            seq = next(self._seq)
+            self._latest[browser_id] = seq
+            self._latest.move_to_end(browser_id)
+            while len(self._latest) > self.sessions:
+                self._latest.popitem(last=False)
+            results = self._cached(key, key[1])
+            if results is not None:
+                return results
+            waiting = self._inflight.get(key)
+            if waiting is None:
+                self._inflight[key] = waiting = {'done': threading.Event(), 'results': None}
+                owner = True
+            else:
+                owner = False
+
+        if owner:
+            try:
+                waiting['results'] = self.fetch(name, source, **kwargs)
+            finally:
+                with self._guard:
+                    if waiting['results'] is not None:
+                        self._store(key, waiting['results'])
+                    del self._inflight[key]
+                waiting['done'].set()
+        else:
+            waiting['done'].wait()
+
+        if self.superseded(browser_id, seq):
+            return None
+        return waiting['results'] if waiting['results'] is not None else []
@@ -0,0 +1,173 @@
+import heapq
+import json
+import logging
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(label):
+    """Method that splits a label into lowercase tokens."""
+    return re.findall(r'\w+', label.lower())
+
+
+class PrefixIndex:
+    """Compact prefix index of (id, label) pairs: the sorted unique tokens, with
+    offsets into one array of postings holding the sorted entries of each token.
+    Updates merge the changed entries into the arrays, and swap them in at once
+    so that searches running meanwhile see either version."""
+
+    def __init__(self, pairs=()):
+        self.ids, self.labels = [], []
+        self._entries = {}
+        self._table = [], array('I', [0]), array('I')
+        self.build(pairs)
+
+    def build(self, pairs):
+        """Method that (re)builds the index from (id, label) pairs."""
+        self.ids, self.labels = [], []
+        self._entries = {}
+        self._table = [], array('I', [0]), array('I')
+        self.update(pairs)
+
+    def update(self, pairs):
+        """Method that adds or replaces entries, keyed by id."""
+        added, removed = {}, {}
+        for id, label in dict(pairs).items():
+            no = self._entries.get(id)
+            if no is None:
+                no = self._entries[id] = len(self.ids)
+                self.ids.append(id)
+                self.labels.append(label)
+            elif self.labels[no] == label:
+                continue
+            else:
+                for token in set(tokenize(self.labels[no])):
+                    removed.setdefault(token, set()).add(no)
+                self.labels[no] = label
+            for token in set(tokenize(label)):
+                added.setdefault(token, []).append(no)
+        if added or removed:
+            self._merge(added, removed)
+
+    def _merge(self, added, removed):
+        old_tokens, old_offsets, old_postings = self._table
+        new_tokens = sorted(set(added) | set(removed))
+        tokens, offsets, postings = [], array('I', [0]), array('I')
+        i = j = 0
+        while i < len(old_tokens) or j < len(new_tokens):
+            if j == len(new_tokens) or (i < len(old_tokens) and old_tokens[i] < new_tokens[j]):
+                # untouched token, its postings are copied as they are
+                tokens.append(old_tokens[i])
+                postings.extend(old_postings[old_offsets[i]:old_offsets[i+1]])
+                offsets.append(len(postings))
+                i += 1
+                continue
+            token = new_tokens[j]
+            entries = set()
+            if i < len(old_tokens) and old_tokens[i] == token:
+                entries.update(old_postings[old_offsets[i]:old_offsets[i+1]])
+                i += 1
+            j += 1
+            entries.difference_update(removed.get(token, ()))
+            entries.update(added.get(token, ()))
+            if entries:
+                tokens.append(token)
+                postings.extend(sorted(entries))
+                offsets.append(len(postings))
+        self._table = tokens, offsets, postings
+
+    def __len__(self):
+        return len(self.ids)
+
+    def matches(self, prefix):
+        """Method that returns the entries having a token starting with the prefix."""
+        tokens, offsets, postings = self._table
+        i = j = bisect_left(tokens, prefix)
+        while j < len(tokens) and tokens[j].startswith(prefix):
+            j += 1
+        return set(postings[offsets[i]:offsets[j]])
+
+    def search(self, name, size=10):
+        """Method that answers a multi-token prefix query like fetch_ids: the first
+        token must match, and at least one of the rest if any are given."""
+        names = tokenize(name)
+        if len(names) == 0:
+            return []
+        found = self.matches(names[0])
+        if len(names) > 1:
+            found &= set().union(*(self.matches(n) for n in names[1:]))
+        return [(self.ids[no], self.labels[no]) for no in heapq.nsmallest(size, found)]
+
+
+def load_fixture(path, field):
+    """Method that reads (id, label) pairs from a json file of documents."""
+    with open(path) as f:
+        docs = json.load(f)
+    return [(d['id'], d[field]) for d in docs if d.get(field)]
+
+
+def scan_index(source, query=None):
+    """Method that reads (id, label) pairs from the ElasticSearch index of a source by scrolling."""
+    from elasticsearch.helpers import scan
+    from es_clients import get_es_client
+    field = source['es_field']
+    body = {'_source': [field, 'id'], 'query': query or {'match_all': {}}}
+    hits = scan(get_es_client(source['es_url']).client, index=source['es_index'], query=body)
+    return [(h['_source']['id'], h['_source'][field]) for h in hits if h['_source'].get(field)]
+
+
+class SuggestIndex(threading.Thread):
+    """Background thread that loads the prefix index of a source and keeps it
+    fresh. If the source defines "es_updated_field", refreshes only fetch the
+    documents updated since the previous load."""
+
+    def __init__(self, source, interval=config.suggest_refresh_interval):
+        super().__init__(name='suggest-{}'.format(source['name']), daemon=True)
+        self.source = source
+        self.interval = interval
+        self.index = None
+        self.loaded = None
+
+    def load(self):
+        """Method that (re)loads the index, incrementally if possible."""
+        started = time.time()
+        if 'es_fixture' in self.source:
+            self.index = PrefixIndex(load_fixture(self.source['es_fixture'], self.source['es_field']))
+        elif self.index is not None and 'es_updated_field' in self.source:
+            since = {'range': {self.source['es_updated_field']: {'gte': int(self.loaded * 1000)}}}
+            self.index.update(scan_index(self.source, since))
+        else:
+            self.index = PrefixIndex(scan_index(self.source))
+        self.loaded = started
+        logger.info('Suggestion index of %s: %d entries in %.1fs', self.source['name'],
+                    len(self.index), time.time() - started)
+
+    def run(self):
+        while True:
+            try:
+                self.load()
+            except Exception:
+                logger.exception('Loading suggestion index of %s failed', self.source['name'])
+            time.sleep(self.interval)
+
+
+_indexes = {}
+_indexes_guard = threading.Lock()
+
+
+def get_suggest_index(source):
+    """Method that returns the loaded prefix index of a source, or None if the
+    source does not enable it or it is still loading."""
+    if not source.get('suggest_index'):
+        return None
+    with _indexes_guard:
+        if source['name'] not in _indexes:
+            _indexes[source['name']] = SuggestIndex(source)
+            _indexes[source['name']].start()
+        return _indexes[source['name']].index
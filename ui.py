@@ -3,27 +3,90 @@ import dash
 from dash.dependencies import Input, Output, State, MATCH, ALL
 import dash_core_components as dcc
 import dash_html_components as html
-from plot_methods import fetch_map, return_stat_plot, update_plots_general, fig_to_json, fig_from_json
-from data_methods import fetch_input, flatten, fetch_ids, fetch_id, mod_cols
+from plot_methods import fetch_map, stat_plots, plot_general, update_plots_general, shared_edges
+from data_methods import fetch_input, fetch_ids, fetch_id, mod_cols, prefetch_entities, to_rows, query_table
+from streaming import iter_response
 from styles import style_div, active_color
-from divs import make_tabs, make_advanced, make_input, make_full_sliders, make_store_plots, fill_visualizations_tab, fill_intra
-import requests
+from divs import make_tabs, make_advanced, make_input, make_full_sliders, fill_visualizations_tab, fill_intra
+from session_store import make_store
+from plot_cache import PlotCache
+from query_cache import QueryCache, query_key
+from simsearch_client import get_client
+from jobs import JobRunner
+from catalog_cache import CatalogCache
+from suggest_dispatch import SuggestionDispatcher
+from janitor import Janitor
+from content_store import contents, MIMETYPES
+from warmup import Warmup
+import config
 import dash_bootstrap_components as dbc
+from flask import Response, abort, request
 from collections import Counter
 import json
+import re
 import uuid
 import plotly.express as px
 import pandas as pd
 import sys
-
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+store = make_store()
+plots = PlotCache(store)
+results = QueryCache()
+searches = JobRunner(name='search')
+warmups = Warmup()
+catalogs = CatalogCache()
+suggestions = SuggestionDispatcher(fetch_ids)
+prefetches = ThreadPoolExecutor(max_workers=config.entity_prefetch_workers, thread_name_prefix='prefetch')
+prefetching = {}
+prefetching_guard = threading.RLock()
+if config.session_backend == 'disk':
+    janitor = Janitor(store, busy=warmups.pending)
+    janitor.start()
 
 app = dash.Dash(__name__, title='Top-k SimSearch', update_title=None,
                 external_stylesheets=[dbc.themes.BOOTSTRAP, 
                                       "https://use.fontawesome.com/releases/v5.7.2/css/all.css"],
 )
+
+
+def prefetch(browser_id, pairs, attr, source):
+    """Method that prefetches the suggested entities of a browser session, dropping
+    its previous prefetch if it has not started yet."""
+    def forget(future):
+        with prefetching_guard:
+            if prefetching.get(browser_id) is future:
+                del prefetching[browser_id]
+
+    with prefetching_guard:
+        previous = prefetching.get(browser_id)
+        if previous is not None:
+            previous.cancel()
+        future = prefetching[browser_id] = prefetches.submit(prefetch_entities, pairs, attr, source)
+    future.add_done_callback(forget)
+
+
+@app.server.route(config.content_url + '<digest>.<ext>')
+def serve_content(digest, ext):
+    """Route serving the rendered maps and images, cached by the browsers."""
+    if ext not in MIMETYPES or re.fullmatch('[0-9a-f]{64}', digest) is None:
+        abort(404)
+    body = contents.get(digest, ext)
+    if body is None:
+        abort(404)
+    response = Response(body, mimetype=MIMETYPES[ext])
+    response.set_etag(digest)
+    # the content of an address never changes
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
 app.layout = html.Div([
     
     dcc.Store(id='suggested_names'), dcc.Store(id='stored_attributes'),
+    dcc.Store(id='browser_id', storage_type='session'),
     html.Span(id='advanced_go', title='Advanced Search Settings',  children=[html.I(id='menu-bars', className="fas fa-bars ml-2")], style={'color':active_color}),
     html.Div(children=html.H1(id='title', children='Top-k Similarity Search'), style=style_div),
     html.Div(children=html.H2(children='Search Conditions'), style=style_div),
@@ -85,6 +148,7 @@ app.layout = html.Div([
             ])),
         dbc.ModalFooter(children = [
             dbc.Button("Save", id="saveAdvanced"),
+            dbc.Button("Refresh Fields", id="refreshAdvanced"),
             dbc.Button("Reset", id="resetAdvanced")]
         )], is_open=True
     ),
@@ -93,7 +157,10 @@ app.layout = html.Div([
     html.Div(id='submit_div', children=[html.Button('Submit', id='submit', style={'border-radius': '10px', 'background-color': active_color, 'color': '#fff', 'padding': '10px 20px', 'font-size': '20px'}),
                                         dcc.Store(id='submit_clicked', data=0),
                                         dcc.Store(id='submit_initialized', data=0),
-                                        dcc.Store(id='submit_finalized', data=0)],
+                                        dcc.Store(id='submit_finalized', data=0),
+                                        dcc.Store(id='search_job'),
+                                        dcc.Interval(id='search_poll', interval=config.job_poll_interval, disabled=True),
+                                        html.P(id='search_status', style={'margin-left': '20px', 'margin-top': '15px', 'color': 'gray'})],
                                         style={'display':'flex', 'justify-content': 'center', 'width': '100%', 'margin-bottom':'20px', 'margin-top':'20px'}),
     make_tabs(),
     dbc.Modal([dbc.ModalHeader("Error"),
@@ -111,7 +178,7 @@ app.layout = html.Div([
                     dbc.Button("Close", id="cancelQuery")]
                 ),
             ],id="confirm",),    
-    dcc.Store(id='msg1'), dcc.Store(id='msg2'), dcc.Store(id='msg3'),
+    dcc.Store(id='msg1'), dcc.Store(id='msg2'), dcc.Store(id='msg3'), dcc.Store(id='msg4'),
     dcc.Loading(dcc.Store(id='session_id')),
     html.Div(id='dump1', style={'display':'none'}), html.Div(id='dump2', style={'display':'none'})
     ])
@@ -133,24 +200,33 @@ app.clientside_callback(
 ) 
 
 @app.callback(
-    [Output("suggested_names", "data")],
+    [Output("suggested_names", "data"), Output("browser_id", "data")],
     [Input("search_bar", "value")],
-    State("stored_source", "data")
+    [State("stored_source", "data"), State("browser_id", "data"),
+     State("stored_attributes", "data")]
 ) 
-def suggest_names(value, source):
+def suggest_names(value, source, browser_id, attr):
     """Callback method for fetching suggestions."""
     ctx = dash.callback_context
     if not ctx.triggered:
-        return [dash.no_update]
+        return [dash.no_update]*2
+    
+    ret = [dash.no_update, dash.no_update]
+    if browser_id is None:
+        browser_id = ret[1] = str(uuid.uuid4())
     
     if len(value) < 3:
-        return [[]]
+        ret[0] = []
+        return ret
         
-    res = fetch_ids(value, source)
-    if res is None:
-        return [[]]
+    res = suggestions.suggest(browser_id, value, source, attr=attr)
+    if res is None: # superseded by a newer keystroke
+        return ret
+    if attr:
+        prefetch(browser_id, res, attr, source)
     
-    return [[lab for val, lab in res]]
+    ret[0] = [lab for val, lab in res]
+    return ret
 
 
 @app.callback(
@@ -195,8 +271,7 @@ def turn_switch(inputs, inputDates, input_titles, attr):
 
 @app.callback(
     [Output("weight_comb_sel", "options"), Output("table", "columns"),
-     Output("table", "data"),  Output("table", "filter_action"),
-     Output("table", "tooltip_data"),
+     Output("table", "page_current"),
     Output({'index': ALL, 'type':'intraplot'}, "figure"), 
     Output({'index': ALL, 'type':'interplot'}, "figure"),
     Output({'type':'sel', 'field': ALL }, "value")],
@@ -211,56 +286,65 @@ def changeTab(tab_selected, weight_combination_selected, session_id, attr,
     """Callback method for updating the content when changing tab."""
     ctx = dash.callback_context
     
-    ret = [dash.no_update]*5 + [[dash.no_update]*len(intra_plot)] + [[dash.no_update]*len(inter_plot)] + [[dash.no_update]*len(plot_sel)]
+    ret = [dash.no_update]*3 + [[dash.no_update]*len(intra_plot)] + [[dash.no_update]*len(inter_plot)] + [[dash.no_update]*len(plot_sel)]
     if not ctx.triggered:
         return ret
     
-    with open('output/data_{}.json'.format(session_id)) as f:
-        data = json.load(f)
-
-    no = len(data)
+    no = store.count_combinations(session_id)
+    if no is None:
+        return ret
     
     if tab_selected == "0":
         options = [{'label' : 'Weight Combination {}'.format(i+1), 'value': str(i)} for i in range(no)]
-        results = data[int(weight_combination_selected)]['rankedResults']
-        columns = mod_cols(results)
-        data = results
-        
-        tooltip_data=[{ column: {'value': str(value), 'type': 'markdown'}
-                       for column, value in row.items()}
-                      for row in data]
+        comb = store.get_combination(session_id, int(weight_combination_selected))
+        if comb is None: # evicted meanwhile
+            return ret
+        columns = mod_cols(comb['rankedResults'])
         
-        ret[:5] = [options, columns, data, 'native', tooltip_data]
+        ret[:3] = [options, columns, 0]
         return ret
     
     elif tab_selected == "1":
-        with open('output/plots_{}.json'.format(session_id)) as f:
-            plots = json.load(f)
-        #### STARTING INTRA HERE ######
-        if plots[0][0][0] is None:
-            intra_figs = [return_stat_plot(data, 1, i) for i in range(no)]
-            #intra_figs += [dash.no_update] * (4-len(intra_figs))
-            inter_figs = return_stat_plot(data, 2, no)
-
-            plots[0][0] = [fig_to_json(fig) for fig in intra_figs]
-            plots[0][1] = [fig_to_json(fig) for fig in inter_figs]
-            with open('output/plots_{}.json'.format(session_id), 'w') as f:
-                json.dump(plots, f, indent=4)
-        else:
-            intra_figs = [fig_from_json(fig) for fig in plots[0][0]]
-            inter_figs = [fig_from_json(fig) for fig in plots[0][1]]
+        figs = stat_plots(session_id, store, plots)
+        if figs is None:
+            return ret
+        intra_figs, inter_figs = figs
         
-        ret[5] = intra_figs
-        ret[6] = inter_figs
+        ret[3] = intra_figs
+        ret[4] = inter_figs
             
         return ret
     
     elif tab_selected == "2":
-        ret[7] = ["0"]*len(plot_sel)
+        ret[5] = ["0"]*len(plot_sel)
         return ret
         #return [dash.no_update]*3 + [dash.no_update]*7 + [["0"]*len(plot_sel)]
 
 
+@app.callback(
+    [Output("table", "data"), Output("table", "tooltip_data"),
+     Output("table", "page_count"), Output("table", "selected_rows")],
+    [Input("table", "page_current"), Input("table", "page_size"),
+     Input("table", "sort_by"), Input("table", "filter_query")],
+    [State("weight_comb_sel", "value"), State("session_id", "data")]
+)
+def update_table(page_current, page_size, sort_by, filter_query,
+                 weight_combination_selected, session_id):
+    """Callback method for serving the visible page of the Listing."""
+    comb = store.get_combination(session_id, int(weight_combination_selected))
+    if comb is None:
+        return [dash.no_update]*4
+    
+    data, page_count = query_table(comb['rankedResults'], page_current or 0, page_size,
+                                   sort_by, filter_query)
+    
+    tooltip_data=[{ column: {'value': str(value), 'type': 'markdown'}
+                   for column, value in row.items()}
+                  for row in data]
+    
+    return [data, tooltip_data, page_count, []]
+
+
 @app.callback(
     [Output({'index': ALL, 'field': MATCH, 'type':'plot2'}, "figure")],
     [Input({'field': MATCH, 'type':'sel'}, "value")],
@@ -268,36 +352,40 @@ def changeTab(tab_selected, weight_combination_selected, session_id, attr,
      State("session_id", "data"), State("stored_attributes", "data"),
      State({'index': ALL, 'type':'title'}, "children")]
 )
-def update_plots_1(sel, plots, session_id, attr, fields):
+def update_plots_1(sel, plot_ids, session_id, attr, fields):
     """Callback method for updating plots (fig) when selecting from dropdown."""    
     ctx = dash.callback_context
     if not ctx.triggered:
-        return [[dash.no_update]*len(plots)]
+        return [[dash.no_update]*len(plot_ids)]
     
-    field = plots[0]['field']
+    field = plot_ids[0]['field']
     attr_name = fields[field].lower()
     attr_type = attr[attr_name]
-    figs = update_plots_general(int(sel[0]), field, attr_name, attr_type, session_id)
+    figs = update_plots_general(int(sel[0]), field, attr_name, attr_type, session_id, store, plots)
+    if figs is None:
+        return [[dash.no_update]*len(plot_ids)]
     
     return [figs]
 
 @app.callback(
-    [Output({'index': ALL, 'field': MATCH, 'type':'plot1'}, "srcDoc")],
+    [Output({'index': ALL, 'field': MATCH, 'type':'plot1'}, "src")],
     [Input({'field': MATCH, 'type':'sel'}, "value")],
     [State({'index': ALL, 'field': MATCH, 'type':'plot1'}, "id"),
      State("session_id", "data"), State("stored_attributes", "data"),
      State({'index': ALL, 'type':'title'}, "children")]
 )
-def update_plots_2(sel, plots, session_id, attr, fields):
+def update_plots_2(sel, plot_ids, session_id, attr, fields):
     """Callback method for updating plots (map) when selecting from dropdown."""    
     ctx = dash.callback_context
     if not ctx.triggered:
-        return [[dash.no_update]*len(plots)]
+        return [[dash.no_update]*len(plot_ids)]
     
-    field = plots[0]['field']
+    field = plot_ids[0]['field']
     attr_name = fields[field].lower()
     attr_type = attr[attr_name]
-    figs = update_plots_general(int(sel[0]), field, attr_name, attr_type, session_id)
+    figs = update_plots_general(int(sel[0]), field, attr_name, attr_type, session_id, store, plots)
+    if figs is None:
+        return [[dash.no_update]*len(plot_ids)]
     
     return [figs]
 
@@ -389,9 +477,10 @@ def updateModal(message, clicked):
 
 @app.callback(
     [Output("message_body", "children"),], 
-    [Input("msg1", "data"), Input("msg2", "data"), Input("msg3", "data")],
+    [Input("msg1", "data"), Input("msg2", "data"), Input("msg3", "data"),
+     Input("msg4", "data")],
 )
-def updateMessage(msg1, msg2, msg3):
+def updateMessage(msg1, msg2, msg3, msg4):
     """Callback method for changing the body of notifications popup."""    
     ctx = dash.callback_context
     if not ctx.triggered or ctx.triggered[0]['prop_id'] == '.':
@@ -404,6 +493,8 @@ def updateMessage(msg1, msg2, msg3):
             return [msg2]
         elif trig == 'msg3.data':
             return [msg3]
+        elif trig == 'msg4.data':
+            return [msg4]
 
 @app.callback(
     [Output("submit_clicked", "data"), Output('submit_initialized', 'data')],
@@ -435,32 +526,67 @@ def change_tab_display(data1, data2):
             return [{'display':'none'}, dash.no_update]
 
 
+def warm_up(session_id, query, attr, no, tab):
+    """Method that schedules the precomputation of the statistics plots and of the
+    default plot of every field and combination, starting with the visible tab."""
+    stats = [(stat_plots, (session_id, store, plots))]
+    edges = [shared_edges(session_id, store, q['column'], attr[q['column']]) for q in query]
+    fields = [(plot_general, (0, i, w, q['column'], attr[q['column']], session_id, store, plots, edges[i]))
+              for i, q in enumerate(query) for w in range(no)]
+    warmups.schedule(session_id, fields + stats if tab == "2" else stats + fields)
+
+
+def run_search(session_id, source, params, attr, tab, progress):
+    """Method that runs a submitted query in the background and stores its results."""
+    key = query_key(source, params, attr)
+    j = results.get(key)
+    if j is None:
+        response = get_client(source).post('search/', json=params, stream=True)
+        
+        if response is None or response.status_code != 200:
+            if response is not None:
+                response.close()
+            return {'error': 'Something is wrong with the service. Please try again later.'}
+        
+        j, received = [], 0
+        with response:
+            for kind, no, value in iter_response(response, attr):
+                if kind == 'row':
+                    received += 1
+                    if received % 100 == 1:
+                        progress(received)
+                else:
+                    j.append(value)
+        
+        if j[0]['rankedResults'] is None:
+            return {'error': j[0]['notification']}
+        
+        results.set(key, j)
+    
+    store.set(session_id, 'data', j)
+    warm_up(session_id, params['queries'], attr, len(j), tab)
+    return {'no': len(j), 'weights': j[0]['weights']}
+
+
 @app.callback(
-    [Output("session_id", "data"), Output("msg1", "data"),
-     Output("submit_finalized", "data"), Output("intra_div", "children"),
-     Output("tab_3", "children"),
-     Output({'index':ALL, 'col':0, 'type':'slider_value'}, "value")],
+    [Output("search_job", "data"), Output("msg1", "data")],
     [Input("submit_initialized", "data")],
     [State("Advanced_3", "value"), State("Advanced_4", "value"),
-     State("Advanced_5", "value"),
-     State("submit_finalized", "data"), State("weights", "children"),
+     State("Advanced_5", "value"), State("weights", "children"),
      State("inputs", "children"), State("stored_attributes", "data"),
      State("stored_source", "data"),
-     State({'index':ALL, 'col':0, 'type':'slider_value'}, "value"),
-     State({'index': ALL, 'type':'slider_title'}, "children"),
-     State({'index': 'Slider_0', 'type':'slider'}, "style")]
+     State({'index': 'Slider_0', 'type':'slider'}, "style"),
+     State("tabs", "value")]
 )
-def submit_query(submitted, decay_factor, rankMethod, apikey, state, sliders,
-                 inputs, attr, source, slider_0_val, slider_titles, slider_0_style):
+def submit_query(submitted, decay_factor, rankMethod, apikey, sliders,
+                 inputs, attr, source, slider_0_style, tab):
     """Callback method for submission of a query."""
-    ret = [dash.no_update]*5 + [[dash.no_update]*len(slider_0_val)]
+    ret = [dash.no_update]*2
     ctx = dash.callback_context
     if not ctx.triggered:    
         return ret
     session_id = str(uuid.uuid4())
     
-    ret[0] = session_id
-    
     k = inputs[0]['props']['children'][1]['props']['children']['props']['value']
     
     query = [fetch_input(inputs[i]['props']['children'], sliders, 
@@ -481,39 +607,71 @@ def submit_query(submitted, decay_factor, rankMethod, apikey, state, sliders,
     
     # params = {'algorithm':rankMethod, 'k':str(k), 'queries': query, 'decay_factor': decay_factor}
     params = {'algorithm':rankMethod, 'k':str(k), 'queries': query, 'decay_factor': decay_factor, "output" : {"extra_columns" : ["name"]},}
-    headers = {'api_key' : source['simsearch_api'], 'Content-Type' : 'application/json'}
     
-    response = requests.post(source['simsearch_url']+'search/', json=params, headers=headers)
-    
-    if response.status_code != 200:
-        ret[1] = 'Something is wrong with the service. Please try again later.'
+    job_id = searches.submit(run_search, session_id, source, params, attr, tab)
+    if job_id is None:
+        ret[1] = 'The service is busy. Please try again later.'
         return ret
-    j = response.json()
     
-    if j[0]['rankedResults'] is None:
-        ret[1] = j[0]['notification']
+    ret[0] = {'job': job_id, 'session': session_id, 'query': query,
+              'auto_weights': slider_0_style['display'] == 'none'}
+    return ret
+
+
+@app.callback(
+    [Output("session_id", "data"), Output("msg4", "data"),
+     Output("submit_finalized", "data"), Output("intra_div", "children"),
+     Output("tab_3", "children"),
+     Output({'index':ALL, 'col':0, 'type':'slider_value'}, "value"),
+     Output("search_poll", "disabled"), Output("search_status", "children")],
+    [Input("search_poll", "n_intervals"), Input("search_job", "data")],
+    [State("submit_finalized", "data"),
+     State("stored_attributes", "data"),
+     State({'index':ALL, 'col':0, 'type':'slider_value'}, "value"),
+     State({'index': ALL, 'type':'slider_title'}, "children"),
+     State("session_id", "data")]
+)
+def poll_query(n_intervals, job, state, attr, slider_0_val, slider_titles, previous):
+    """Callback method for polling the background execution of a submitted query."""
+    ret = [dash.no_update]*5 + [[dash.no_update]*len(slider_0_val)] + [dash.no_update]*2
+    ctx = dash.callback_context
+    if not ctx.triggered or job is None:
+        return ret
+    if ctx.triggered[0]['prop_id'] == 'search_job.data':
+        ret[6] = False
         return ret
-   
-    no = len(j)
     
-    for i in range(len(j)):
-        j[i]['rankedResults'] = flatten(j[i]['rankedResults'], attr)
+    status = searches.status(job['job'])
+    if status is None or status['status'] == 'failed':
+        ret[1] = 'Something is wrong with the service. Please try again later.'
+        ret[6:] = [True, '']
+        return ret
+    if status['status'] == 'pending':
+        ret[7] = 'Queued ({} ahead)...'.format(searches.position(job['job']))
+        return ret
+    if status['status'] == 'running':
+        if status['progress']:
+            ret[7] = 'Searching... {} results received'.format(status['progress'])
+        else:
+            ret[7] = 'Searching...'
+        return ret
     
-    with open('output/data_{}.json'.format(session_id), 'w') as f:
-        json.dump(j, f, indent=4)
-        
-    with open('output/plots_{}.json'.format(session_id), 'w') as f:
-        json.dump(make_store_plots(attr, no), f, indent=4)        
-
-    open('output/locks_{}.lock'.format(session_id), 'w')
-        
+    ret[6:] = [True, '']
+    result = status['result']
+    if 'error' in result:
+        ret[1] = result['error']
+        return ret
     
+    no = result['no']
+    if previous is not None:
+        warmups.cancel(previous)
+    ret[0] = job['session']
     ret[2] = state+1
     ret[3] = fill_intra(no)
-    ret[4] = fill_visualizations_tab(query, attr, no)
+    ret[4] = fill_visualizations_tab(job['query'], attr, no)
     
-    if slider_0_style['display'] == 'none':
-        weights = j[0]['weights']
+    if job['auto_weights']:
+        weights = result['weights']
         for a in weights:
             index = slider_titles.index(a['attribute'].capitalize())
             ret[5][index] = [a['value']]
@@ -589,7 +747,7 @@ def openSelectedData(sel, confirmQuery, cancelQuery, rows):
 
     if ctx.triggered:
         trig = ctx.triggered[0]['prop_id']
-        if trig == 'table.selected_rows':
+        if trig == 'table.selected_rows' and sel:
             ret[0] = True
             
             r = [(k.split('_')[0],v) for k,v in rows[sel[0]].items() 
@@ -656,12 +814,13 @@ def weights_collapse(n, is_open):
     [Output("advanced_menu", "is_open"), Output({'index': 'Input_0', 'type':'input0'}, "value"),
      Output("stored_attributes", "data"), Output("inputs", "children"),
      Output("weights", "children"), Output("msg3", "data")],
-    [Input("advanced_go", "n_clicks"), Input("saveAdvanced", "n_clicks")],
+    [Input("advanced_go", "n_clicks"), Input("saveAdvanced", "n_clicks"),
+     Input("refreshAdvanced", "n_clicks")],
     [State("advanced_menu", "is_open"), State("Advanced_2", "value"),
      State("Advanced_4", "value"), State("stored_source", "data"),
      State("Advanced_5", "value")],
 )
-def advanced_collapse(n, n2, is_open, k, method, source, apikey):
+def advanced_collapse(n, n2, n3, is_open, k, method, source, apikey):
     """Callback method for showing advanced settings menu & corresponding fetching of fields."""
     ctx = dash.callback_context
 
@@ -673,7 +832,7 @@ def advanced_collapse(n, n2, is_open, k, method, source, apikey):
     trig = ctx.triggered[0]['prop_id']
     if trig == 'advanced_go.n_clicks':
         ret[0] = True
-    elif trig == 'saveAdvanced.n_clicks':
+    elif trig == 'saveAdvanced.n_clicks' or trig == 'refreshAdvanced.n_clicks':
         if source['api_required']:
             if apikey is None or apikey == '':
                 ret[5] = 'This Source requires an API key.'
@@ -682,12 +841,10 @@ def advanced_collapse(n, n2, is_open, k, method, source, apikey):
                 ret[5] = 'Wrong API Key.'
                 return ret
         
-        headers = { 'api_key' : source['simsearch_api'], 'Content-Type' : 'application/json'}
-        response = requests.post(source['simsearch_url']+'catalog/', json={}, headers=headers)
+        d = catalogs.get(source, revalidate=trig == 'refreshAdvanced.n_clicks')
         d2 = {}
         children = [make_input(0, 'k', 'number', val=k)]
-        if response.status_code == 200:
-            d = response.json()
+        if d is not None:
             if method == 'pivot_based':
                 d = {dd['column']: dd['datatype'] for dd in d if dd['operation'] == 'pivot_based'}
             else:
@@ -712,9 +869,11 @@ def update_copy_data(n_clicks, sel, session_id):
     """Callback method for preparing download of Listing."""
     if not n_clicks:
         return dash.no_update
-    with open('output/data_{}.json'.format(session_id)) as f:
-        data = json.load(f)
-    d = json.dumps(data[int(sel)], indent=4)
+    data = store.get_combination(session_id, int(sel))
+    if data is None:
+        return dash.no_update
+    data = dict(data, rankedResults=to_rows(data['rankedResults']))
+    d = json.dumps(data, indent=4)
     return d
 
 
@@ -834,4 +993,5 @@ if __name__ == '__main__':
         if not sys.argv[2].isnumeric():
             raise ValueError('Wrong arguments')
         port = int(sys.argv[2])
+    logging.basicConfig(level=logging.INFO)
     app.run_server(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,59 @@
+import itertools
+import logging
+import queue
+import threading
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Precomputes the plots of sessions in the background on a bounded pool of
+    workers. Tasks run in the order they are scheduled within a session, the
+    sessions taking turns, and the pending tasks of a cancelled session are dropped."""
+
+    def __init__(self, workers=config.warmup_workers, name='warmup'):
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending = {}
+        self._cancelled = set()
+        self._guard = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._work, name='{}-{}'.format(name, i), daemon=True).start()
+
+    def schedule(self, session_id, tasks):
+        """Method that schedules the (fn, args) tasks of a session, most urgent first."""
+        with self._guard:
+            self._cancelled.discard(session_id)
+            self._pending[session_id] = self._pending.get(session_id, 0) + len(tasks)
+            for rank, (fn, args) in enumerate(tasks):
+                self._queue.put((rank, next(self._seq), session_id, fn, args))
+
+    def cancel(self, session_id):
+        """Method that drops the pending tasks of a session."""
+        with self._guard:
+            if session_id in self._pending:
+                self._cancelled.add(session_id)
+
+    def pending(self, session_id):
+        """Method that returns the number of tasks of a session not yet run."""
+        with self._guard:
+            return self._pending.get(session_id, 0)
+
+    def _done(self, session_id):
+        with self._guard:
+            self._pending[session_id] -= 1
+            if self._pending[session_id] == 0:
+                del self._pending[session_id]
+                self._cancelled.discard(session_id)
+
+    def _work(self):
+        while True:
+            rank, seq, session_id, fn, args = self._queue.get()
+            try:
+                if session_id not in self._cancelled:
+                    fn(*args)
+            except Exception:
+                logger.exception('Warm-up of session %s failed', session_id)
+            finally:
+                self._done(session_id)
@@ -0,0 +1,55 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from wordcloud import WordCloud, STOPWORDS
+import config
+
+
+def counter_key(counter, width, height):
+    """Method that returns the hash of a frequency Counter rendered at given dimensions."""
+    body = repr((width, height, sorted(counter.items())))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class WordCloudCache:
+    """LRU cache of rendered word clouds, keyed by the hash of their frequencies
+    and dimensions, so repeated views and overlapping combinations reuse images."""
+
+    def __init__(self, size=config.wordcloud_cache_size, workers=config.wordcloud_workers):
+        self.size = size
+        self._images = OrderedDict()
+        self._guard = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wordcloud')
+
+    def render(self, counter, width, height):
+        """Method that returns the PIL image of the word cloud of a Counter."""
+        key = counter_key(counter, width, height)
+        with self._guard:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+        wc = WordCloud(width=width, height=height, random_state=1,
+                       background_color='salmon', colormap='Pastel1',
+                       collocations=False, stopwords=STOPWORDS)
+        image = wc.generate_from_frequencies(counter).to_image()
+        with self._guard:
+            self._images[key] = image
+            while len(self._images) > self.size:
+                self._images.popitem(last=False)
+        return image
+
+    def png(self, counter, width, height):
+        """Method that returns the word cloud of a Counter as PNG bytes."""
+        buf = BytesIO()
+        self.render(counter, width, height).save(buf, format='PNG')
+        return buf.getvalue()
+
+    def png_many(self, counters, width, height):
+        """Method that renders the word clouds of several Counters in parallel."""
+        return list(self._executor.map(lambda c: self.png(c, width, height), counters))
+
+
+wordclouds = WordCloudCache()